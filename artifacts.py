@@ -0,0 +1,182 @@
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+# 생성 결과물 저장소 기본값
+ARTIFACT_ROOT = os.path.join(os.getcwd(), "outputs")
+ARTIFACT_TTL_SECONDS = 1800             # 작성이 끝난 지(commit) 30분 지난 결과물 삭제
+ARTIFACT_QUOTA_BYTES = 5 * 1024 ** 3    # 전체 결과물 최대 용량
+REAP_INTERVAL_SECONDS = 60              # 정리 주기
+
+INDEX_FILENAME = "index.json"
+
+
+def _directory_size(path):
+    total = 0
+    for entry in os.scandir(path):
+        if entry.is_file(follow_symlinks=False):
+            total += entry.stat(follow_symlinks=False).st_size
+    return total
+
+
+class ArtifactStore:
+    """
+    작업별 디렉토리에 생성 결과물을 보관하는 저장소
+    - 작업 ID마다 고유 디렉토리 (root/<작업 ID>/)를 만들어 파일명 충돌 방지
+    - 인덱스(작업 ID -> 생성 시각, 작성 완료 시각, 크기)로 O(1) 조회
+    - 백그라운드 정리 스레드가 TTL과 전체 용량 한도를 적용 (요청 경로에서 디렉토리 스캔 없음)
+    - TTL은 commit() 시점부터 계산하며, 아직 commit되지 않은(대기/생성/렌더링 중인) 결과물은 삭제하지 않음
+    - 인덱스는 정리 주기마다 index.json에 저장되고, 시작 시 한 번만 디렉토리와 맞춤
+    """
+
+    def __init__(self, root=ARTIFACT_ROOT, ttl=ARTIFACT_TTL_SECONDS, quota_bytes=ARTIFACT_QUOTA_BYTES,
+                 reap_interval=REAP_INTERVAL_SECONDS, on_remove=None):
+        self.root = root
+        self.ttl = ttl
+        self.quota_bytes = quota_bytes
+        self.reap_interval = reap_interval
+        self.on_remove = on_remove  # 삭제된 작업 ID마다 호출
+        self._lock = threading.Lock()
+        self._index = OrderedDict()  # 작업 ID -> {'created', 'committed', 'size'} (commit된 항목은 commit 순서)
+        self._total_bytes = 0
+        self._dirty = False
+        self._reaper = None
+        self._stop = threading.Event()
+        os.makedirs(root, exist_ok=True)
+        self._load_index()
+
+    @property
+    def index_path(self):
+        return os.path.join(self.root, INDEX_FILENAME)
+
+    def _load_index(self):
+        index = {}
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, encoding='utf-8') as f:
+                    index = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"결과물 인덱스를 읽을 수 없어 다시 만듭니다: {str(e)}")
+
+        # 인덱스 저장 전에 종료되어 빠진 디렉토리 복구, 사라진 디렉토리 제거
+        for entry in os.scandir(self.root):
+            if entry.is_dir() and entry.name not in index:
+                index[entry.name] = {'created': entry.stat().st_mtime, 'size': _directory_size(entry.path)}
+        for artifact_id in [a for a in index if not os.path.isdir(os.path.join(self.root, a))]:
+            del index[artifact_id]
+
+        # 이전 실행에서 commit되지 않은 디렉토리는 더 이상 작성되지 않으므로 commit된 것으로 취급
+        for entry in index.values():
+            if entry.get('committed') is None:
+                entry['committed'] = entry['created']
+        for artifact_id, entry in sorted(index.items(), key=lambda item: item[1]['committed']):
+            self._index[artifact_id] = entry
+            self._total_bytes += entry['size']
+        self._dirty = True
+
+    def create(self, artifact_id=None):
+        """새 결과물 디렉토리를 만들고 경로 반환 (artifact_id를 생략하면 고유 ID 생성)"""
+        artifact_id = artifact_id or uuid.uuid4().hex
+        directory = os.path.join(self.root, artifact_id)
+        os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            if artifact_id not in self._index:
+                self._index[artifact_id] = {'created': time.time(), 'committed': None, 'size': 0}
+                self._dirty = True
+        return directory
+
+    def commit(self, artifact_id):
+        """결과물 작성이 끝난 뒤 디렉토리 크기와 완료 시각을 인덱스에 기록 (이때부터 TTL 계산)"""
+        directory = self.path(artifact_id)
+        if directory is None or not os.path.isdir(directory):
+            return
+        size = _directory_size(directory)
+        with self._lock:
+            entry = self._index.get(artifact_id)
+            if entry is not None:
+                self._total_bytes += size - entry['size']
+                entry['size'] = size
+                entry['committed'] = time.time()
+                self._index.move_to_end(artifact_id)
+                self._dirty = True
+
+    def path(self, artifact_id):
+        """작업 ID의 결과물 디렉토리 (없으면 None)"""
+        with self._lock:
+            if artifact_id not in self._index:
+                return None
+        return os.path.join(self.root, artifact_id)
+
+    def info(self, artifact_id):
+        with self._lock:
+            entry = self._index.get(artifact_id)
+            return dict(entry) if entry else None
+
+    @property
+    def total_bytes(self):
+        return self._total_bytes
+
+    def reap(self, now=None):
+        """
+        TTL이 지난 결과물과 용량 한도를 넘는 오래된 결과물을 삭제하고 삭제된 ID 목록 반환
+        아직 작성 중인(commit되지 않은) 결과물은 건너뜀
+        """
+        now = now or time.time()
+        removed = []
+        with self._lock:
+            # commit된 항목은 commit 순서라서 앞에서부터만 확인하면 됨 (작성 중인 항목만 건너뜀)
+            for artifact_id, entry in list(self._index.items()):
+                if entry['committed'] is None:
+                    continue
+                if now - entry['committed'] <= self.ttl and self._total_bytes <= self.quota_bytes:
+                    break
+                del self._index[artifact_id]
+                self._total_bytes -= entry['size']
+                removed.append(artifact_id)
+            if removed:
+                self._dirty = True
+
+        for artifact_id in removed:
+            shutil.rmtree(os.path.join(self.root, artifact_id), ignore_errors=True)
+            if self.on_remove is not None:
+                try:
+                    self.on_remove(artifact_id)
+                except Exception as e:
+                    print(f"결과물 삭제 콜백 오류: {str(e)}")
+
+        self._save_index()
+        return removed
+
+    def _save_index(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            snapshot = dict(self._index)
+            self._dirty = False
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, self.index_path)
+
+    def start_reaper(self):
+        """백그라운드 정리 스레드 시작"""
+        if self._reaper is None:
+            self._reaper = threading.Thread(target=self._reap_loop, name="artifact-reaper", daemon=True)
+            self._reaper.start()
+
+    def _reap_loop(self):
+        while not self._stop.wait(self.reap_interval):
+            try:
+                removed = self.reap()
+                if removed:
+                    print(f"오래된 결과물 {len(removed)}개 삭제")
+            except Exception as e:
+                print(f"결과물 정리 중 오류 발생: {str(e)}")
+
+    def stop(self):
+        self._stop.set()
+        self._save_index()
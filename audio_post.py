@@ -0,0 +1,244 @@
+import math
+
+import ffmpeg
+import numpy as np
+import soundfile as sf
+from scipy.signal import lfilter
+
+# 청크 하나의 길이(초) - 후처리 중 메모리에 있는 버퍼 크기를 결정
+CHUNK_SECONDS = 1.0
+
+# audiocraft normalize_loudness 기본값과 동일
+LOUDNESS_HEADROOM_DB = 14
+ENERGY_FLOOR = 2e-3
+# 기존 경로(clamp(-0.99999, 0.99999))와 같은 클리핑 한계
+CLIP_LIMIT = 0.99999
+
+# 별도로 저장할 수 있는 압축 오디오 결과물 형식 (ffmpeg 출력 옵션)
+AUDIO_FORMATS = {
+    'opus': {'acodec': 'libopus', 'audio_bitrate': '128k', 'ar': 48000},  # Opus는 32kHz를 지원하지 않음
+    'mp3': {'acodec': 'libmp3lame', 'audio_bitrate': '192k'},
+    'flac': {'acodec': 'flac'},
+}
+
+# ITU-R BS.1770 (torchaudio.functional.loudness와 같은 값)
+GATE_SECONDS = 0.4
+GATE_OVERLAP = 0.75
+ABSOLUTE_GATE_LUFS = -70.0
+KWEIGHT_BIAS = -0.691
+
+
+def _treble_biquad(sample_rate, gain_db=4.0, central_freq=1500.0, q=1 / math.sqrt(2)):
+    w0 = 2 * math.pi * central_freq / sample_rate
+    alpha = math.sin(w0) / 2 / q
+    a = math.exp(gain_db / 40 * math.log(10))
+    temp1 = 2 * math.sqrt(a) * alpha
+    temp2 = (a - 1) * math.cos(w0)
+    temp3 = (a + 1) * math.cos(w0)
+    b = [a * ((a + 1) + temp2 + temp1), -2 * a * ((a - 1) + temp3), a * ((a + 1) + temp2 - temp1)]
+    den = [(a + 1) - temp2 + temp1, 2 * ((a - 1) - temp3), (a + 1) - temp2 - temp1]
+    return np.array(b) / den[0], np.array(den) / den[0]
+
+
+def _highpass_biquad(sample_rate, cutoff_freq=38.0, q=0.5):
+    w0 = 2 * math.pi * cutoff_freq / sample_rate
+    alpha = math.sin(w0) / 2.0 / q
+    b = [(1 + math.cos(w0)) / 2, -1 - math.cos(w0), (1 + math.cos(w0)) / 2]
+    den = [1 + alpha, -2 * math.cos(w0), 1 - alpha]
+    return np.array(b) / den[0], np.array(den) / den[0]
+
+
+def iter_chunks(wav, chunk_samples):
+    """[채널, 샘플] 배열을 복사 없이 chunk_samples 길이의 뷰로 나누는 함수"""
+    for start in range(0, wav.shape[-1], chunk_samples):
+        yield wav[:, start:start + chunk_samples]
+
+
+class LoudnessMeter:
+    """
+    청크 단위로 오디오를 받아 한 번의 패스로 통합 라우드니스(LUFS)와 RMS를 측정하는 미터
+    K-가중 필터 상태를 청크 사이에 이어가고, 100ms 단위 에너지 합만 보관하므로
+    트랙 길이와 관계없이 청크 크기만큼의 버퍼만 사용 (400ms 블록, 75% 겹침, 절대/상대 게이트)
+    """
+
+    def __init__(self, sample_rate, channels):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.gate_samples = int(round(GATE_SECONDS * sample_rate))
+        self.hop_samples = int(round(self.gate_samples * (1 - GATE_OVERLAP)))
+        self.hops_per_block = max(1, int(round(self.gate_samples / self.hop_samples)))
+        self._filters = []
+        for b, a in (_treble_biquad(sample_rate), _highpass_biquad(sample_rate)):
+            self._filters.append([b, a, np.zeros((channels, 2))])
+        self._hop_energy = []  # [채널] 배열 리스트, 100ms 단위 제곱합
+        self._partial = np.zeros(channels)
+        self._partial_samples = 0
+        self._sum_squares = 0.0
+        self._total_samples = 0
+
+    def update(self, chunk):
+        """[채널, 샘플] 청크 하나 반영"""
+        chunk = np.asarray(chunk, dtype=np.float64)
+        self._sum_squares += float(np.square(chunk).sum())
+        self._total_samples += chunk.shape[-1]
+
+        filtered = chunk
+        for state in self._filters:
+            b, a, zi = state
+            filtered, state[2] = lfilter(b, a, filtered, axis=-1, zi=zi)
+            # torchaudio biquad(lfilter clamp=True)와 같게 [-1, 1]로 제한
+            np.clip(filtered, -1.0, 1.0, out=filtered)
+        squared = np.square(filtered)
+
+        position = 0
+        length = squared.shape[-1]
+        while position < length:
+            take = min(self.hop_samples - self._partial_samples, length - position)
+            self._partial += squared[:, position:position + take].sum(axis=-1)
+            self._partial_samples += take
+            position += take
+            if self._partial_samples == self.hop_samples:
+                self._hop_energy.append(self._partial)
+                self._partial = np.zeros(self.channels)
+                self._partial_samples = 0
+
+    @property
+    def rms(self):
+        return math.sqrt(self._sum_squares / max(1, self._total_samples * self.channels))
+
+    def integrated_loudness(self):
+        """게이트를 적용한 통합 라우드니스(LUFS), 블록이 없으면 -inf"""
+        if len(self._hop_energy) < self.hops_per_block:
+            return float('-inf')
+        hops = np.stack(self._hop_energy)  # [hop 수, 채널]
+        cumulative = np.concatenate([np.zeros((1, self.channels)), np.cumsum(hops, axis=0)])
+        block_energy = (cumulative[self.hops_per_block:] - cumulative[:-self.hops_per_block]) / self.gate_samples
+        weights = np.array([1.0, 1.0, 1.0, 1.41, 1.41])[:self.channels]
+
+        with np.errstate(divide='ignore'):
+            block_loudness = KWEIGHT_BIAS + 10 * np.log10((block_energy * weights).sum(axis=-1))
+            gated = block_loudness > ABSOLUTE_GATE_LUFS
+            if not gated.any():
+                return float('-inf')
+            relative_gate = KWEIGHT_BIAS + 10 * np.log10((block_energy[gated].mean(axis=0) * weights).sum()) - 10
+            gated &= block_loudness > relative_gate
+            if not gated.any():
+                return float('-inf')
+            return float(KWEIGHT_BIAS + 10 * np.log10((block_energy[gated].mean(axis=0) * weights).sum()))
+
+
+def loudness_gain(loudness_lufs, rms, headroom_db=LOUDNESS_HEADROOM_DB, energy_floor=ENERGY_FLOOR):
+    """목표 라우드니스(-headroom_db LUFS)로 맞추는 게인 (무음에 가까우면 1.0)"""
+    if rms < energy_floor or not math.isfinite(loudness_lufs):
+        return 1.0
+    return 10.0 ** ((-headroom_db - loudness_lufs) / 20.0)
+
+
+def measure_loudness(wav, sample_rate, chunk_seconds=CHUNK_SECONDS):
+    """[채널, 샘플] 배열의 통합 라우드니스(LUFS)와 RMS를 청크 단위 한 번의 패스로 측정"""
+    meter = LoudnessMeter(sample_rate, wav.shape[0])
+    for chunk in iter_chunks(wav, max(1, int(chunk_seconds * sample_rate))):
+        meter.update(chunk)
+    return meter.integrated_loudness(), meter.rms
+
+
+# 무음 판정 기준 (프레임 RMS가 이 값보다 작으면 무음)
+SILENCE_DB = -50.0
+ANALYSIS_FRAME = 2048
+ANALYSIS_HOP = 512
+
+
+def estimate_tempo(wav, sample_rate, start_bpm=120.0):
+    """[채널, 샘플] 배열의 템포(BPM)와 비트 위치(초)를 librosa 비트 트래킹으로 추정 (start_bpm은 사전 템포)"""
+    import librosa
+
+    mono = np.asarray(wav, dtype=np.float32).mean(axis=0)
+    tempo, beats = librosa.beat.beat_track(
+        y=mono, sr=sample_rate, start_bpm=start_bpm, hop_length=ANALYSIS_HOP, units='time'
+    )
+    return float(np.atleast_1d(tempo)[0]), beats
+
+
+def silence_ratio(wav, threshold_db=SILENCE_DB):
+    """[채널, 샘플] 배열에서 RMS가 threshold_db(dBFS) 미만인 분석 프레임의 비율"""
+    import librosa
+
+    mono = np.asarray(wav, dtype=np.float32).mean(axis=0)
+    rms = librosa.feature.rms(y=mono, frame_length=ANALYSIS_FRAME, hop_length=ANALYSIS_HOP)[0]
+    return float(np.mean(rms < 10 ** (threshold_db / 20)))
+
+
+def process_chunk(chunk, gain, compressor=True):
+    """청크 하나에 게인, (선택) tanh 압축, 클리핑을 적용한 float32 배열 반환"""
+    out = np.multiply(chunk, gain, dtype=np.float32)
+    if compressor:
+        np.tanh(out, out=out)
+    np.clip(out, -CLIP_LIMIT, CLIP_LIMIT, out=out)
+    return out
+
+
+def write_wav(wav, sample_rate, path, gain=1.0, compressor=True, chunk_seconds=CHUNK_SECONDS):
+    """
+    게인과 압축을 청크마다 적용하면서 16비트 WAV로 바로 기록하는 함수
+    전체 트랙 크기의 복사본을 만들지 않으며, 동시에 존재하는 버퍼는 청크 하나 분량뿐
+    """
+    with sf.SoundFile(path, 'w', samplerate=sample_rate, channels=wav.shape[0], subtype='PCM_16', format='WAV') as f:
+        for chunk in iter_chunks(wav, max(1, int(chunk_seconds * sample_rate))):
+            f.write(process_chunk(chunk, gain, compressor).T)
+
+
+def write_normalized_wav(wav, sample_rate, path, headroom_db=LOUDNESS_HEADROOM_DB, compressor=True,
+                         chunk_seconds=CHUNK_SECONDS):
+    """
+    normalize_audio(strategy="loudness") + audio_write와 같은 결과를 두 번의 스트리밍 패스로 만드는 함수
+    (측정 패스에서 게인을 구하고, 기록 패스에서 청크마다 적용). 측정한 라우드니스와 게인 반환
+    """
+    wav = np.asarray(wav)
+    if wav.ndim == 1:
+        wav = wav[None]
+    loudness, rms = measure_loudness(wav, sample_rate, chunk_seconds)
+    gain = loudness_gain(loudness, rms, headroom_db)
+    write_wav(wav, sample_rate, path, gain, compressor, chunk_seconds)
+    return loudness, gain
+
+
+def pcm_input(sample_rate, channels):
+    """표준 입력으로 float32 PCM(채널 인터리브)을 받는 ffmpeg 입력 스트림"""
+    return ffmpeg.input('pipe:', format='f32le', ar=sample_rate, ac=channels)
+
+
+def audio_output(stream, path, audio_format):
+    """압축 오디오 결과물(opus/mp3/flac) ffmpeg 출력"""
+    if audio_format not in AUDIO_FORMATS:
+        raise ValueError(f"지원하지 않는 오디오 형식입니다: {audio_format} (지원: {', '.join(AUDIO_FORMATS)})")
+    return ffmpeg.output(stream, path, **AUDIO_FORMATS[audio_format])
+
+
+def run_pcm_pipe(outputs, wav, sample_rate, gain=1.0, compressor=True, chunk_seconds=CHUNK_SECONDS):
+    """
+    ffmpeg 출력들을 실행하고 게인/압축을 적용한 PCM을 청크 단위로 표준 입력에 써 넣는 함수
+    WAV 임시 파일 없이 메모리에서 바로 인코더/먹서로 전달됨
+    """
+    process = (
+        ffmpeg
+        .merge_outputs(*outputs)
+        .global_args('-nostats', '-loglevel', 'error')
+        .overwrite_output()
+        .run_async(pipe_stdin=True, pipe_stderr=True)
+    )
+    try:
+        for chunk in iter_chunks(wav, max(1, int(chunk_seconds * sample_rate))):
+            process.stdin.write(process_chunk(chunk, gain, compressor).T.tobytes())
+        process.stdin.close()
+    except BrokenPipeError:
+        pass  # ffmpeg가 먼저 종료됨, 아래에서 오류 메시지로 보고
+    stderr = process.stderr.read()
+    process.wait()
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg 인코딩 실패: {stderr.decode(errors='replace').strip()}")
+
+
+def encode_audio(wav, sample_rate, path, audio_format, gain=1.0, compressor=True):
+    """게인/압축을 적용한 PCM을 파이프로 넘겨 압축 오디오 파일(opus/mp3/flac)로 저장하는 함수"""
+    audio = pcm_input(sample_rate, wav.shape[0]).audio
+    run_pcm_pipe([audio_output(audio, path, audio_format)], wav, sample_rate, gain, compressor)
@@ -0,0 +1,209 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+
+from settings import genre_prompts, get_genre_settings
+
+# 배치 렌더링 기본값
+OUTPUT_DIR = os.path.join(os.getcwd(), "renders")
+STATE_FILE = "state.jsonl"      # 완료/실패 기록 (재실행 시 완료된 항목 건너뜀)
+REPORT_FILE = "report.json"     # 실행 요약
+RENDER_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+POLL_INTERVAL = 1.0
+
+
+def load_manifest(path):
+    """
+    매니페스트 파일(.jsonl, .yaml/.yml, .json)을 항목 딕셔너리 리스트로 읽는 함수
+    YAML/JSON은 항목 리스트 또는 {'defaults': {...}, 'items': [...]} 형식
+    """
+    with open(path, encoding='utf-8') as f:
+        if path.endswith('.jsonl'):
+            data = [json.loads(line) for line in f if line.strip()]
+        elif path.endswith(('.yaml', '.yml')):
+            import yaml
+            data = yaml.safe_load(f)
+        else:
+            data = json.load(f)
+    if isinstance(data, dict):
+        defaults = data.get('defaults', {})
+        data = [dict(defaults, **entry) for entry in data.get('items', [])]
+    return data
+
+
+def catalog_prompts(name):
+    """이름으로 프롬프트 목록 찾기 ('city_pop', 'future_funk' 또는 settings.genre_prompts의 장르명)"""
+    if name in genre_prompts:
+        return list(genre_prompts[name])
+    import main
+    catalogs = {'city_pop': main.city_pop_prompts, 'future_funk': main.future_funk_prompts}
+    if name not in catalogs:
+        raise ValueError(f"알 수 없는 프롬프트 카탈로그입니다: {name} (지원: {', '.join(list(catalogs) + list(genre_prompts))})")
+    return list(catalogs[name])
+
+
+def item_key(prompt, settings):
+    """프롬프트와 생성 설정으로 만든 항목 키 (재실행 시 같은 항목인지 판단)"""
+    payload = json.dumps({'prompt': prompt, 'settings': settings}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def expand_manifest(entries):
+    """
+    매니페스트 항목을 렌더링할 트랙 목록으로 펼치는 함수
+    항목 필드: prompt 또는 catalog, genre, overrides, seed, count, id
+    - catalog: 목록의 프롬프트마다 트랙 생성
+    - count: 같은 프롬프트로 만들 트랙 수 (seed가 있으면 seed, seed+1, ...)
+    """
+    items = []
+    for index, entry in enumerate(entries):
+        genre = entry.get('genre', 'City Pop')
+        if 'catalog' in entry:
+            prompts = catalog_prompts(entry['catalog'])
+        elif 'prompt' in entry:
+            prompts = [entry['prompt']]
+        else:
+            prompts = catalog_prompts(genre)[:1]
+        entry_id = str(entry.get('id', index))
+        count = int(entry.get('count', 1))
+        for p, prompt in enumerate(prompts):
+            for k in range(count):
+                settings = get_genre_settings(genre).copy()
+                settings.update(entry.get('overrides', {}))
+                seed = entry.get('seed')
+                settings['seed'] = None if seed is None or seed < 0 else int(seed) + k
+                item_id = entry_id
+                if len(prompts) > 1:
+                    item_id += f"_p{p}"
+                if count > 1:
+                    item_id += f"_{k}"
+                items.append({
+                    'id': item_id,
+                    'prompt': prompt,
+                    'settings': settings,
+                    'key': item_key(prompt, settings),
+                })
+    return items
+
+
+def load_state(path):
+    """상태 파일에서 항목 ID별 마지막 기록 읽기"""
+    state = {}
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    state[record['id']] = record
+    return state
+
+
+def is_completed(record, item):
+    """같은 설정으로 완료되었고 결과 파일이 남아 있으면 True"""
+    return (
+        record is not None
+        and record['status'] == 'done'
+        and record['key'] == item['key']
+        and record.get('video') is not None
+        and os.path.exists(record['video'])
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="매니페스트의 프롬프트 카탈로그를 무인으로 일괄 렌더링")
+    parser.add_argument('manifest', help="매니페스트 파일 (.jsonl, .yaml, .json)")
+    parser.add_argument('--output-dir', default=OUTPUT_DIR)
+    parser.add_argument('--render-workers', type=int, default=RENDER_WORKERS, help="동시에 실행할 비디오 합성 프로세스 수")
+    parser.add_argument('--max-batch-size', type=int, help="한 번의 generate 호출에 묶을 최대 트랙 수")
+    parser.add_argument('--force', action='store_true', help="완료된 항목도 다시 렌더링")
+    parser.add_argument('--dry-run', action='store_true', help="렌더링할 항목만 출력")
+    args = parser.parse_args()
+
+    items = expand_manifest(load_manifest(args.manifest))
+    os.makedirs(args.output_dir, exist_ok=True)
+    state_path = os.path.join(args.output_dir, STATE_FILE)
+    state = load_state(state_path)
+
+    pending = [item for item in items if args.force or not is_completed(state.get(item['id']), item)]
+    skipped = len(items) - len(pending)
+    print(f"전체 {len(items)}개 중 {skipped}개 완료됨, {len(pending)}개 렌더링 예정")
+    if args.dry_run:
+        for item in pending:
+            print(f"  {item['id']}: [{item['settings']['genre']}] {item['prompt'][:60]}")
+        return
+    if not pending:
+        return
+
+    # 모델과 작업 파이프라인은 렌더링할 항목이 있을 때만 로드
+    from main import LocalEDMGenerator
+    from jobs import JobManager
+    from batching import MAX_BATCH_SIZE
+
+    generator = LocalEDMGenerator()
+    jobs = JobManager(
+        generator,
+        render_workers=args.render_workers,
+        max_pending_renders=args.render_workers * 2,
+        max_batch_size=args.max_batch_size or MAX_BATCH_SIZE
+    )
+
+    started = time.time()
+    running = {}
+    for item in pending:
+        job = jobs.submit(item['prompt'], item['settings'], output_dir=os.path.join(args.output_dir, item['id']))
+        running[job.id] = (item, job)
+
+    results = []
+    try:
+        with open(state_path, 'a', encoding='utf-8') as state_file:
+            while running:
+                for job_id, (item, job) in list(running.items()):
+                    if not job.done:
+                        continue
+                    del running[job_id]
+                    record = {
+                        'id': item['id'],
+                        'key': item['key'],
+                        'status': 'done' if job.result is not None else 'failed',
+                        'video': job.result,
+                        'error': job.error,
+                        'duration': item['settings']['duration'],
+                        'seconds': round(job.finished - job.created, 2),
+                    }
+                    state_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    state_file.flush()
+                    results.append(record)
+                    print(f"[{len(results)}/{len(pending)}] {item['id']}: {record['status']}"
+                          + (f" ({job.error})" if job.error else ""))
+                if running:
+                    time.sleep(POLL_INTERVAL)
+    finally:
+        jobs.shutdown()
+
+    elapsed = time.time() - started
+    completed = [record for record in results if record['status'] == 'done']
+    audio_seconds = sum(record['duration'] for record in completed)
+    report = {
+        'manifest': os.path.abspath(args.manifest),
+        'total': len(items),
+        'skipped': skipped,
+        'completed': len(completed),
+        'failed': len(results) - len(completed),
+        'elapsed_seconds': round(elapsed, 1),
+        'audio_seconds': audio_seconds,
+        'realtime_factor': round(audio_seconds / elapsed, 3) if elapsed > 0 else None,
+        'items': results,
+    }
+    report_path = os.path.join(args.output_dir, REPORT_FILE)
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    print(f"완료 {report['completed']}개, 실패 {report['failed']}개, 건너뜀 {skipped}개 "
+          f"({elapsed:.0f}초, 오디오 {audio_seconds}초, 실시간 대비 {report['realtime_factor']}배)")
+    print(f"요약 저장: {report_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+import threading
+import time
+import traceback
+from concurrent.futures import Future
+
+from tracing import tracer
+
+# 마이크로 배칭 기본값
+MAX_BATCH_SIZE = 4        # 한 번의 generate 호출에 묶을 최대 요청 수
+MAX_WAIT_SECONDS = 0.5    # 첫 요청이 배치 상대를 기다리는 최대 시간
+
+# 같은 generate 호출로 묶일 수 있는지 판단하는 설정 키
+# (배치 전체가 같은 렌더링 설정을 쓰므로 video_backend, beat_sync도 포함)
+BATCH_KEYS = ('duration', 'temperature', 'top_k', 'top_p', 'cfg_coef', 'window_duration', 'window_overlap',
+              'genre', 'seed', 'reference_audio', 'video_backend', 'beat_sync')
+# beat_sync가 켜진 요청만 추가로 구분하는 키 (bpm은 비트 추적의 사전 템포)
+BEAT_SYNC_KEYS = ('bpm',)
+
+
+def batch_key(settings):
+    """생성 파라미터가 같은 요청끼리 같은 키를 갖도록 설정을 튜플로 변환"""
+    keys = BATCH_KEYS + BEAT_SYNC_KEYS if settings.get('beat_sync') else BATCH_KEYS
+    return tuple(settings.get(key) for key in keys)
+
+
+class _PendingRequest:
+    def __init__(self, prompt, settings, progress_callback, on_audio, output_dir, trace_id, deferred):
+        self.prompt = prompt
+        self.settings = settings
+        self.progress_callback = progress_callback
+        self.on_audio = on_audio
+        self.output_dir = output_dir
+        self.trace_id = trace_id
+        self.deferred = deferred
+        self.future = Future()
+        self.arrival = time.monotonic()
+
+
+class GenerationBatcher:
+    """
+    동시에 들어온 생성 요청을 모아 한 번의 stream_tracks 호출로 처리하는 수집기
+    - 생성 파라미터가 같은 요청만 같은 배치로 묶음
+    - 시드가 지정된 요청은 결과가 배치 구성에 따라 달라지지 않도록 단독으로 실행
+    - 배치가 max_batch_size에 도달하거나 가장 오래된 요청이 max_wait초를 기다리면 실행
+    - scheduler(CostScheduler)가 있으면 예상 비용이 짧은 그룹부터(aging 적용), 없으면 오래된 그룹부터 실행
+    - 모델 호출은 전용 워커 스레드(workers개)에서만 이루어짐
+      workers > 1은 모델이 동시 호출을 지원할 때만 사용 (예: replicas.PooledMusicGen)
+    """
+
+    def __init__(self, generator, max_batch_size=MAX_BATCH_SIZE, max_wait=MAX_WAIT_SECONDS, render=None,
+                 scheduler=None, workers=1):
+        self.generator = generator
+        self.render = render  # None이면 생성기가 직접 저장/비디오 생성
+        self.scheduler = scheduler
+        self.workers = max(1, int(workers))
+        self._running_until = {}  # 워커 이름 -> 실행 중인 배치의 예상 종료 시각 (time.monotonic 기준)
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait))
+        self._pending = {}  # batch_key -> [_PendingRequest, ...]
+        self._condition = threading.Condition()
+        self._workers = [
+            threading.Thread(target=self._run, name=f"generation-batcher-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, prompt, settings, progress_callback=None, on_audio=None, output_dir=None, trace_id=None,
+               deferred=False):
+        """
+        요청을 대기열에 넣고 비디오 경로(render를 지정했다면 render의 반환값)를 돌려줄 Future 반환
+        on_audio가 주어지면 디코딩된 오디오 구간 (sample_rate, int16 배열)마다 호출됨
+        output_dir가 주어지면 결과물을 해당 디렉토리에 저장
+        trace_id가 주어지면 이 요청이 포함된 배치의 스팬이 해당 ID로 기록됨
+        deferred가 True이면 미뤄지지 않은 다른 요청이 모두 처리된 뒤에 실행됨 (scheduler가 있을 때)
+        """
+        request = _PendingRequest(prompt, dict(settings), progress_callback, on_audio, output_dir, trace_id, deferred)
+        with self._condition:
+            self._pending.setdefault(batch_key(request.settings), []).append(request)
+            self._condition.notify()
+        return request.future
+
+    def _limit(self, requests):
+        return self.max_batch_size if requests[0].settings.get('seed') is None else 1
+
+    def _group_cost(self, requests):
+        return self.scheduler.cost(requests[0].settings, min(len(requests), self._limit(requests)))
+
+    def _group_priority(self, requests, now):
+        return self.scheduler.priority(self._group_cost(requests), now - requests[0].arrival, requests[0].deferred)
+
+    def expected_wait(self, settings, deferred=False):
+        """
+        지금 settings 요청을 넣으면 디코딩이 시작되기까지의 예상 대기 시간(초)
+        (실행 중인 배치들의 남은 시간 + 이 요청보다 먼저 실행될 그룹들의 예상 비용) / 워커 수
+        """
+        if self.scheduler is None:
+            return 0.0
+        key = batch_key(settings)
+        with self._condition:
+            now = time.monotonic()
+            wait = sum(max(0.0, until - now) for until in self._running_until.values())
+            own_priority = self.scheduler.priority(self.scheduler.cost(settings), 0.0, deferred)
+            for group_key, requests in self._pending.items():
+                if group_key != key and self._group_priority(requests, now) <= own_priority:
+                    wait += self._group_cost(requests)
+            return wait / self.workers
+
+    def _next_batch(self):
+        """실행할 배치가 준비될 때까지 대기한 뒤 꺼내서 반환"""
+        with self._condition:
+            while True:
+                if not self._pending:
+                    self._condition.wait()
+                    continue
+
+                now = time.monotonic()
+                if self.scheduler is None:
+                    # 가장 오래 기다린 요청이 있는 그룹을 우선 처리
+                    key, requests = min(self._pending.items(), key=lambda item: item[1][0].arrival)
+                else:
+                    # 예상 비용이 가장 작은 그룹 우선 (오래 기다릴수록 비용이 깎임)
+                    key, requests = min(self._pending.items(), key=lambda item: self._group_priority(item[1], now))
+                waited = now - requests[0].arrival
+                limit = self._limit(requests)
+                if len(requests) >= limit or waited >= self.max_wait:
+                    batch = requests[:limit]
+                    remaining = requests[limit:]
+                    if remaining:
+                        self._pending[key] = remaining
+                    else:
+                        del self._pending[key]
+                    if self.scheduler is not None:
+                        self._running_until[threading.current_thread().name] = now + self._group_cost(batch)
+                    return batch
+
+                self._condition.wait(timeout=self.max_wait - waited)
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+
+            def progress(value, desc=""):
+                for request in batch:
+                    if request.progress_callback is not None:
+                        request.progress_callback(value, desc=desc)
+
+            output_dirs = [request.output_dir for request in batch]
+            if any(directory is None for directory in output_dirs):
+                output_dirs = None
+
+            try:
+                if len(batch) > 1:
+                    print(f"배치 생성: {len(batch)}개 요청")
+                with tracer.bind([request.trace_id for request in batch]):
+                    events = self.generator.stream_tracks(
+                        [request.prompt for request in batch],
+                        batch[0].settings,
+                        progress,
+                        render=self.render,
+                        output_dirs=output_dirs
+                    )
+                    for kind, index, payload in events:
+                        request = batch[index]
+                        if kind == 'audio':
+                            if request.on_audio is not None:
+                                request.on_audio(payload)
+                        elif kind == 'video':
+                            request.future.set_result(payload)
+            except Exception as e:
+                print(f"배치 생성 중 오류 발생: {str(e)}")
+                traceback.print_exc()
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+            finally:
+                with self._condition:
+                    self._running_until.pop(threading.current_thread().name, None)
@@ -0,0 +1,145 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import tempfile
+
+import numpy as np
+import soundfile as sf
+from audiocraft.data.audio import audio_write
+
+from measurement import measure
+from audio_post import write_normalized_wav, measure_loudness, loudness_gain
+from main import LocalEDMGenerator, VIDEO_BACKENDS, ANIMATION_PATH, loop_cache, render_video, render_track
+from video_cache import mux_looped_pcm
+from stub_model import StubMusicGen
+from capacity import CapacityModel
+
+# 벤치마크 기본 매트릭스
+DEFAULT_DURATIONS = [10, 30, 60, 120, 300]
+DEFAULT_BATCH_SIZES = [1, 2, 4]
+
+BENCHMARK_SETTINGS = {
+    "temperature": 0.3,
+    "top_k": 50,
+    "top_p": 0.8,
+    "cfg_coef": 5.0,
+    "genre": "benchmark",
+    "seed": 0
+}
+
+BENCHMARK_PROMPT = "benchmark prompt"
+
+
+def run_case(generator, duration, batch_size, backends, work_dir):
+    """한 (길이, 배치 크기) 조합의 단계별 측정 결과 반환"""
+    settings = dict(BENCHMARK_SETTINGS, duration=duration)
+    prompts = [f"{BENCHMARK_PROMPT} {i}" for i in range(batch_size)]
+    stages = {}
+
+    # 디코딩 (렌더링 단계는 측정에서 분리하기 위해 오디오만 받아둠)
+    decoded = []
+    with measure(stages, 'decode') as record:
+        for _ in generator.stream_tracks(prompts, settings, render=lambda wav, *args: decoded.append(wav)):
+            pass
+    record['audio_seconds'] = duration * batch_size
+
+    # 라우드니스 정규화 + WAV 저장 (배치의 첫 트랙 기준)
+    # legacy: 트랙 전체를 텐서로 정규화한 뒤 저장, streaming: 청크 단위 측정/기록 (audio_post)
+    base_path = os.path.join(work_dir, f"bench_{duration}s_b{batch_size}")
+    with measure(stages, 'postprocess:legacy') as record:
+        audio_write(f"{base_path}_legacy", decoded[0], generator.model.sample_rate,
+                    strategy="loudness", loudness_compressor=True)
+    legacy_path = f"{base_path}_legacy.wav"
+    record['output_bytes'] = os.path.getsize(legacy_path)
+
+    audio_path = f"{base_path}.wav"
+    with measure(stages, 'postprocess:streaming') as record:
+        write_normalized_wav(decoded[0].numpy(), generator.model.sample_rate, audio_path)
+    record['output_bytes'] = os.path.getsize(audio_path)
+
+    # 두 경로의 출력 차이 (16비트 양자화 수준이어야 함)
+    legacy, _ = sf.read(legacy_path, dtype='float32')
+    streamed, _ = sf.read(audio_path, dtype='float32')
+    stages['postprocess:streaming']['max_abs_diff_vs_legacy'] = float(np.abs(legacy - streamed).max())
+    del legacy, streamed
+    os.remove(legacy_path)
+
+    # 비디오 합성 (백엔드별)
+    for backend in backends:
+        video_path = f"{base_path}_{backend}.mp4"
+        with measure(stages, f"video:{backend}") as record:
+            render_video(audio_path, video_path, backend)
+        record['output_bytes'] = os.path.getsize(video_path)
+        os.remove(video_path)
+
+    # WAV 없이 정규화된 PCM을 ffmpeg에 파이프로 전달하는 경로 (render_track의 기본 경로)
+    if 'ffmpeg' in backends:
+        sample_rate = generator.model.sample_rate
+        wav = decoded[0].numpy()
+        video_path = f"{base_path}_ffmpeg_pipe.mp4"
+        with measure(stages, 'video:ffmpeg_pipe') as record:
+            loudness, rms = measure_loudness(wav, sample_rate)
+            mux_looped_pcm(loop_cache.get_loop(ANIMATION_PATH, fps=24), wav, sample_rate, video_path,
+                           loudness_gain(loudness, rms))
+        record['output_bytes'] = os.path.getsize(video_path)
+        os.remove(video_path)
+
+        # 비트 추적 + 비트 정렬 루프(캐시되면 재사용) + 파이프 먹싱
+        with measure(stages, 'video:ffmpeg_beat') as record:
+            video_path = render_track(wav, sample_rate, f"{base_path}_beat", 'ffmpeg', beat_bpm=120)
+        record['output_bytes'] = os.path.getsize(video_path)
+        os.remove(video_path)
+    del decoded
+
+    os.remove(audio_path)
+    return {'duration': duration, 'batch_size': batch_size, 'stages': stages}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="스텁 모델로 생성 파이프라인 단계별 성능 측정")
+    parser.add_argument('--durations', type=int, nargs='+', default=DEFAULT_DURATIONS)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=DEFAULT_BATCH_SIZES)
+    parser.add_argument('--backends', nargs='+', default=list(VIDEO_BACKENDS), choices=VIDEO_BACKENDS)
+    parser.add_argument('--output', help="결과 JSON 파일 경로 (생략하면 표준 출력)")
+    args = parser.parse_args()
+
+    generator = LocalEDMGenerator(model=StubMusicGen(), capacity=CapacityModel(path=None))
+    report = {
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'model': generator.model_id,
+            'sample_rate': generator.model.sample_rate,
+        },
+        'setup': {},
+        'results': [],
+    }
+
+    # 루프 영상 캐시는 한 번만 만들어지므로 별도 단계로 측정
+    if 'ffmpeg' in args.backends:
+        with measure(report['setup'], 'loop_cache_warmup'):
+            loop_cache.get_loop(ANIMATION_PATH, fps=24)
+
+    work_dir = tempfile.mkdtemp(prefix="musicgen_bench_")
+    try:
+        for duration in args.durations:
+            for batch_size in args.batch_sizes:
+                print(f"측정 중: {duration}초, 배치 {batch_size}")
+                report['results'].append(run_case(generator, duration, batch_size, args.backends, work_dir))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+        print(f"결과 저장: {args.output}")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+import json
+import os
+import threading
+import time
+
+# 디코딩 속도 기록 파일
+CAPACITY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".capacity.json")
+# 기록이 없을 때 가정하는 초당 생성 스텝 수 (스텝 하나 = 배치의 각 트랙에 토큰 하나씩)
+DEFAULT_STEPS_PER_SECOND = 25.0
+# MusicGen 토큰 프레임 레이트 (초당 토큰 수)
+DEFAULT_FRAME_RATE = 50
+# 진행 상황 보고 최소 간격(초)
+PROGRESS_INTERVAL = 0.25
+
+
+class CapacityModel:
+    """
+    배치 크기별 디코딩 속도(초당 스텝 수)를 지수 이동 평균으로 기록하고,
+    duration과 배치 크기로 작업의 디코딩 시간을 예측하는 모델
+    - 기록은 모델 식별자 + 디바이스별로 구분 (select로 지정, 스텁/CPU 모델의 속도가 GPU 모델 예측에 섞이지 않음)
+    - path=None이면 파일에 저장하지 않음 (벤치마크/스윕 등 측정 도구용)
+    """
+
+    def __init__(self, path=CAPACITY_PATH, alpha=0.2):
+        self.path = path
+        self.alpha = alpha
+        self.key = None
+        self._lock = threading.Lock()
+        self._profiles = {}  # '모델@디바이스' -> {배치 크기(문자열) -> {'steps_per_second', 'samples'}}
+        if path and os.path.exists(path):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    profiles = json.load(f)
+                # 모델/디바이스 구분이 없던 이전 형식의 기록은 어느 모델의 속도인지 알 수 없으므로 버림
+                self._profiles = {key: stats for key, stats in profiles.items() if 'steps_per_second' not in stats}
+            except (OSError, ValueError, AttributeError) as e:
+                print(f"디코딩 속도 기록을 읽을 수 없습니다: {str(e)}")
+
+    def select(self, model_id, device):
+        """이후 기록/예측에 사용할 모델과 디바이스 지정"""
+        with self._lock:
+            self.key = f"{model_id}@{device}"
+
+    @property
+    def _stats(self):
+        return self._profiles.setdefault(self.key, {})
+
+    def record(self, batch_size, steps, seconds):
+        """디코딩 한 번의 결과 기록 (steps: 새로 생성한 토큰 프레임 수)"""
+        if seconds <= 0 or steps <= 0:
+            return
+        rate = steps / seconds
+        with self._lock:
+            entry = self._stats.setdefault(str(batch_size), {'steps_per_second': rate, 'samples': 0})
+            entry['steps_per_second'] += self.alpha * (rate - entry['steps_per_second'])
+            entry['samples'] += 1
+            snapshot = json.dumps(self._profiles)
+        if self.path:
+            tmp_path = f"{self.path}.tmp"
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(snapshot)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                print(f"디코딩 속도 기록 저장 실패: {str(e)}")
+
+    def steps_per_second(self, batch_size=1):
+        """배치 크기의 예상 초당 스텝 수 (기록이 없으면 가장 가까운 배치 크기의 기록 사용)"""
+        with self._lock:
+            if not self._stats:
+                return DEFAULT_STEPS_PER_SECOND
+            nearest = min(self._stats, key=lambda size: abs(int(size) - batch_size))
+            return self._stats[nearest]['steps_per_second']
+
+    def estimate_seconds(self, duration, batch_size=1, frame_rate=DEFAULT_FRAME_RATE):
+        """duration초 트랙을 batch_size 배치로 디코딩하는 데 걸릴 예상 시간(초)"""
+        return duration * frame_rate / self.steps_per_second(batch_size)
+
+    def snapshot(self):
+        """선택된 모델/디바이스의 배치 크기별 기록"""
+        with self._lock:
+            return json.loads(json.dumps(self._stats))
+
+
+class DecodeProgress:
+    """
+    MusicGen의 스텝별 진행 콜백을 받아 전체 디코딩 진행률, 초당 토큰 수, 남은 시간을 계산
+    롱폼 생성처럼 여러 번의 generate 호출에 걸친 진행률도 하나로 합쳐서 보고
+    """
+
+    def __init__(self, total_steps, batch_size, report=None, start=0.3, end=0.6):
+        self.total_steps = max(1, total_steps)
+        self.batch_size = batch_size
+        self.report = report  # report(value, desc)
+        self.start, self.end = start, end
+        self.done_steps = 0
+        self._window_steps = 0
+        self._window_done = 0
+        self._started = time.perf_counter()
+        self._last_report = float('-inf')
+
+    def start_window(self, new_steps):
+        """generate 호출 하나 시작 (new_steps: 이어서 생성할 때 프롬프트를 뺀 새로 생성할 스텝 수)"""
+        self._window_steps = new_steps
+        self._window_done = 0
+
+    def finish_window(self):
+        """generate 호출 하나 완료 (스텝별 콜백이 없는 모델도 호출 단위로는 진행률이 보고됨)"""
+        self.done_steps += self._window_steps
+        self._window_steps = self._window_done = 0
+        self._last_report = float('-inf')
+        self(0, 0)
+
+    @property
+    def completed_steps(self):
+        return min(self.total_steps, self.done_steps + self._window_done)
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self._started
+
+    @property
+    def steps_per_second(self):
+        elapsed = self.elapsed
+        return self.completed_steps / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def eta(self):
+        rate = self.steps_per_second
+        return (self.total_steps - self.completed_steps) / rate if rate > 0 else None
+
+    def __call__(self, generated_tokens, tokens_to_generate):
+        """
+        model.set_custom_progress_callback에 등록하는 콜백
+        audiocraft는 이어서 생성할 때도 프롬프트를 뺀 새로 생성한 스텝 수를 generated_tokens로 넘김
+        """
+        if self._window_steps:
+            self._window_done = min(self._window_steps, max(0, generated_tokens))
+        now = time.perf_counter()
+        if self.report is None or now - self._last_report < PROGRESS_INTERVAL:
+            return
+        self._last_report = now
+        fraction = self.completed_steps / self.total_steps
+        tokens_per_second = self.steps_per_second * self.batch_size
+        eta = self.eta
+        desc = f"음악 생성 중... {tokens_per_second:.0f} tok/s"
+        if eta is not None:
+            desc += f", 남은 시간 약 {eta:.0f}초"
+        self.report(self.start + (self.end - self.start) * fraction, desc)
@@ -0,0 +1,175 @@
+import hashlib
+import math
+import os
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+import torch
+
+from tracing import tracer
+
+# 크로마 특징 저장 위치
+CHROMA_STORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".chroma_store")
+# 멜로디 조건 이름 (MusicGen melody 모델의 WaveformConditioner)
+MELODY_CONDITION = 'self_wav'
+# 저장 형식 버전 (추출 방식이 바뀌면 올려서 이전 특징을 다시 쓰지 않게 함)
+CHROMA_FORMAT = 'stem1'
+
+_hash_lock = threading.Lock()
+_hash_memo = {}  # (경로, 크기, 수정 시각) -> 해시
+
+
+def audio_hash(path):
+    """
+    레퍼런스 오디오 파일 내용의 SHA-256 해시 (디코딩하지 않고 파일 바이트만 읽음)
+    같은 파일을 반복해서 쓰면 (경로, 크기, 수정 시각)으로 기억해 둔 값을 재사용
+    """
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _hash_lock:
+        if memo_key in _hash_memo:
+            return _hash_memo[memo_key]
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    value = digest.hexdigest()
+    with _hash_lock:
+        _hash_memo[memo_key] = value
+    return value
+
+
+def _match_length(chroma, length):
+    """audiocraft의 평가 시 처리와 같이 크로마를 length 프레임으로 자르거나 반복"""
+    if length is None or chroma.shape[0] == length:
+        return chroma
+    if chroma.shape[0] < length:
+        chroma = chroma.repeat(int(math.ceil(length / chroma.shape[0])), 1)
+    return chroma[:length]
+
+
+class ChromaStore:
+    """
+    레퍼런스 오디오의 크로마 특징을 디스크에 보관하는 저장소 (멜로디 조건 생성용)
+    - 키: 모델 이름 + 저장 형식 버전 + 오디오 파일 해시, 값: 트랙 전체의 크로마 [프레임, 12] (.npy)
+    - 크로마는 MusicGen.generate_with_chroma와 같은 경로(demucs stem 분리 후 크로마 추출)로 계산
+    - 저장된 특징은 메모리 매핑으로 읽으므로 같은 레퍼런스를 다시 쓰면 오디오를 디코딩/분석하지 않음
+    install(model)로 모델의 멜로디 조건기에 연결하고, using(keys) 안에서 생성하면
+    배치의 각 프롬프트에 해당 키의 크로마가 조건으로 들어감 (키가 None인 프롬프트는 멜로디 없이 생성)
+    generate_continuation으로 이어 붙이는 롱폼 윈도우에도 같은 멜로디 조건이 유지됨
+    """
+
+    def __init__(self, store_dir=CHROMA_STORE_DIR):
+        self.store_dir = store_dir
+        os.makedirs(store_dir, exist_ok=True)
+        self.model = None
+        self.conditioner = None
+        self._arrays = {}  # 키 -> 메모리 매핑된 배열
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def install(self, model):
+        """MusicGen 모델의 멜로디 조건기에 연결 (멜로디 조건이 없는 모델이면 False)"""
+        provider = getattr(getattr(model, 'lm', None), 'condition_provider', None)
+        conditioner = provider.conditioners.get(MELODY_CONDITION) if provider is not None else None
+        if conditioner is None or not hasattr(conditioner, '_compute_wav_embedding'):
+            return False
+        self.model = model
+        self.conditioner = conditioner
+        self._wrap(conditioner)
+        return True
+
+    def key(self, audio_path):
+        return f"{self.model.name.replace('/', '_')}_{CHROMA_FORMAT}_{audio_hash(audio_path)}"
+
+    def _path(self, key):
+        return os.path.join(self.store_dir, f"{key}.npy")
+
+    def get(self, key):
+        """저장된 크로마 (메모리 매핑, 없으면 None)"""
+        with self._lock:
+            array = self._arrays.get(key)
+        if array is None and os.path.exists(self._path(key)):
+            array = np.load(self._path(key), mmap_mode='r')
+            with self._lock:
+                self._arrays[key] = array
+        return array
+
+    def prepare(self, audio_path):
+        """레퍼런스 오디오의 크로마를 저장소에 준비하고 키 반환 (저장되어 있으면 오디오를 읽지 않음)"""
+        key = self.key(audio_path)
+        stored = self.get(key) is not None
+        tracer.increment('chroma_store_total', result='hit' if stored else 'miss')
+        if not stored:
+            with tracer.span('chroma_extract'):
+                chroma = self._extract(audio_path)
+            # 다른 프로세스가 읽는 중에도 안전하도록 임시 파일에 쓴 뒤 교체
+            temp_path = self._path(key) + f".{os.getpid()}.tmp.npy"
+            np.save(temp_path, chroma)
+            os.replace(temp_path, self._path(key))
+        return key
+
+    def _extract(self, audio_path):
+        """
+        오디오를 모델 샘플레이트/채널로 변환한 뒤 조건기의 _compute_wav_embedding으로
+        demucs stem 분리(_get_stemmed_wav)와 크로마 추출을 거쳐 [프레임, 12] 반환
+        """
+        from audiocraft.data.audio import audio_read
+        from audiocraft.data.audio_utils import convert_audio
+
+        wav, sample_rate = audio_read(audio_path)
+        wav = convert_audio(wav, sample_rate, self.model.sample_rate, self.model.audio_channels)
+        with torch.no_grad():
+            chroma = self.conditioner._compute_wav_embedding(wav[None].to(self.model.device), self.model.sample_rate)
+        return chroma[0].float().cpu().numpy()
+
+    @contextmanager
+    def using(self, keys):
+        """이 스레드에서 실행하는 생성의 프롬프트별 멜로디 조건 지정 (키 목록, 배치 순서)"""
+        self._local.keys = list(keys)
+        try:
+            yield
+        finally:
+            self._local.keys = None
+
+    def _chroma(self, key, length):
+        chroma = torch.from_numpy(np.asarray(self.get(key)))
+        return _match_length(chroma, length)
+
+    def _wrap(self, conditioner):
+        tokenize = conditioner.tokenize
+        get_embedding = conditioner._get_wav_embedding
+
+        def keyed_tokenize(x):
+            # CFG 배치는 [조건 있는 행..., 빈 조건 행...] 순서이므로 앞의 행에 키를 붙이고
+            # 길이를 크로마 길이로 바꿔 마스크되지 않게 함
+            x = tokenize(x)
+            keys = getattr(self._local, 'keys', None)
+            if not keys or not any(keys):
+                return x
+            paths = list(x.path)
+            lengths = x.length.clone()
+            factor = conditioner._downsampling_factor()
+            for i, key in enumerate(keys):
+                if key is not None:
+                    frames = self._chroma(key, getattr(conditioner, 'chroma_len', None)).shape[0]
+                    paths[i] = key
+                    lengths[i] = frames * factor
+            return x._replace(length=lengths, path=paths)
+
+        def stored_embedding(x):
+            with self._lock:
+                keys = [path if path in self._arrays else None for path in (x.path or [])]
+            if not any(keys):
+                return get_embedding(x)
+            length = getattr(conditioner, 'chroma_len', None)
+            rows = [self._chroma(key, length) if key is not None else None for key in keys]
+            reference = next(row for row in rows if row is not None)
+            rows = [row if row is not None else torch.zeros_like(reference) for row in rows]
+            length = max(row.shape[0] for row in rows)
+            rows = [torch.nn.functional.pad(row, (0, 0, 0, length - row.shape[0])) for row in rows]
+            return torch.stack(rows).to(x.wav.device)
+
+        conditioner.tokenize = keyed_tokenize
+        conditioner._get_wav_embedding = stored_embedding
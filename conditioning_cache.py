@@ -0,0 +1,154 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import nullcontext
+
+import torch
+
+from tracing import tracer
+
+# 조건 캐시 기본값
+MAX_ENTRIES = 512                 # 보관할 최대 조건 수
+MAX_BYTES = 256 * 1024 ** 2       # 디바이스 메모리에 보관할 최대 크기
+
+
+def fingerprint(value):
+    """텐서/리스트/튜플이 섞인 값의 내용 해시 (멜로디 오디오 등 조건 입력의 캐시 키)"""
+    digest = hashlib.sha1()
+
+    def update(item):
+        if isinstance(item, torch.Tensor):
+            digest.update(f"T{tuple(item.shape)}{item.dtype}".encode())
+            digest.update(item.detach().cpu().float().contiguous().numpy().tobytes())
+        elif isinstance(item, (list, tuple)):
+            digest.update(f"L{len(item)}".encode())
+            for element in item:
+                update(element)
+        else:
+            digest.update(repr(item).encode())
+
+    update(value)
+    return digest.hexdigest()
+
+
+def _nbytes(tensors):
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+class ConditioningCache:
+    """
+    MusicGen 조건(텍스트 T5 임베딩, 멜로디 크로마 임베딩)을 디바이스 메모리에 보관하는 LRU 캐시
+    - 텍스트: 문자열 하나 단위로 (임베딩, 마스크)를 저장하고, 배치는 캐시된 항목을 패딩해 합침
+      (T5 인코더는 패딩 위치를 마스크하므로 배치로 인코딩한 결과와 같음)
+    - 멜로디: 조건 입력(오디오 텐서, 길이, 샘플레이트)의 내용 해시로 크로마 임베딩을 저장
+    install(model)로 모델의 조건기(conditioner)에 연결
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # 키 -> 텐서 튜플
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._text_conditioners = {}  # 조건 이름 -> 캐시를 연결한 텍스트 조건기
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+        tracer.increment('conditioning_cache_total', kind=key[0], result='hit' if value is not None else 'miss')
+        return value
+
+    def _put(self, key, value):
+        size = _nbytes(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= _nbytes(self._entries.pop(key))
+            self._entries[key] = value
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= _nbytes(evicted)
+
+    def install(self, model):
+        """MusicGen 모델의 텍스트/멜로디 조건기에 캐시 연결, 연결한 조건 이름 목록 반환"""
+        from audiocraft.modules.conditioners import TextConditioner, WaveformConditioner
+
+        provider = getattr(getattr(model, 'lm', None), 'condition_provider', None)
+        if provider is None:
+            return []
+        installed = []
+        for name, conditioner in provider.conditioners.items():
+            if isinstance(conditioner, TextConditioner):
+                self._wrap_text(name, conditioner)
+                installed.append(name)
+            elif isinstance(conditioner, WaveformConditioner):
+                self._wrap_waveform(name, conditioner)
+                installed.append(name)
+        return installed
+
+    def _wrap_text(self, name, conditioner):
+        # tokenize는 문자열 목록을 그대로 넘기고, forward에서 문자열별로 캐시 조회/인코딩
+        tokenize = conditioner.tokenize
+        encode = conditioner.forward
+
+        def encode_one(text):
+            key = ('text', name, text)
+            entry = self._get(key)
+            if entry is None:
+                embeds, mask = encode(tokenize([text]))
+                entry = (embeds[0], mask[0])
+                self._put(key, entry)
+            return entry
+
+        def cached_forward(texts):
+            entries = [encode_one("" if text is None else text) for text in texts]
+            length = max(embeds.shape[0] for embeds, _ in entries)
+            embeds = torch.stack([
+                torch.nn.functional.pad(e, (0, 0, 0, length - e.shape[0])) for e, _ in entries
+            ])
+            mask = torch.stack([torch.nn.functional.pad(m, (0, length - m.shape[0])) for _, m in entries])
+            return embeds, mask
+
+        conditioner.tokenize = lambda texts: list(texts)
+        conditioner.forward = cached_forward
+        self._text_conditioners[name] = conditioner
+
+    def _wrap_waveform(self, name, conditioner):
+        get_embedding = conditioner._get_wav_embedding
+
+        def cached_embedding(*args):
+            key = ('wav', name, fingerprint(args))
+            entry = self._get(key)
+            if entry is None:
+                entry = (get_embedding(*args),)
+                self._put(key, entry)
+            return entry[0]
+
+        conditioner._get_wav_embedding = cached_embedding
+
+    def warm(self, model, texts, batch_size=8):
+        """texts의 텍스트 조건을 미리 인코딩해 캐시에 넣음 (CFG의 빈 조건용 ''도 함께)"""
+        texts = list(dict.fromkeys(list(texts) + [""]))
+        with torch.no_grad(), getattr(model, 'autocast', None) or nullcontext():
+            for conditioner in self._text_conditioners.values():
+                for start in range(0, len(texts), batch_size):
+                    conditioner.forward(texts[start:start + batch_size])
+        return len(texts)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
@@ -0,0 +1,113 @@
+import argparse
+import json
+import os
+import platform
+
+import torch
+
+from measurement import measure
+from capacity import CapacityModel
+from device_profile import CpuProfile, MODEL_NAMES
+from main import LocalEDMGenerator
+
+# 비교에 사용할 프롬프트와 생성 설정 (top_k=1 그리디 샘플링으로 설정 간 차이만 비교)
+BENCHMARK_PROMPTS = [
+    "lo-fi hip hop with warm rhodes and vinyl crackle",
+    "energetic future bass with bright supersaw chords",
+]
+BENCHMARK_SETTINGS = {
+    "temperature": 1.0,
+    "top_k": 1,
+    "top_p": 0.0,
+    "cfg_coef": 3.0,
+    "genre": "cpu_benchmark",
+    "seed": 0
+}
+
+# 비교할 CPU 프로필 (이름 -> 양자화, 컴파일)
+PROFILES = {
+    'fp32': (False, False),
+    'int8': (True, False),
+    'int8+compile': (True, True),
+}
+
+
+def log_spectrum(wav, n_fft=2048):
+    """[채널, 샘플] 오디오의 평균 로그 크기 스펙트럼 (위상/정렬에 둔감한 비교용)"""
+    mono = wav.float().mean(dim=0)
+    spec = torch.stft(mono, n_fft, hop_length=n_fft // 4, window=torch.hann_window(n_fft), return_complex=True)
+    return torch.log1p(spec.abs()).mean(dim=-1)
+
+
+def spectral_similarity(reference, candidate):
+    """두 오디오의 평균 로그 스펙트럼 코사인 유사도 (1에 가까울수록 비슷함)"""
+    return float(torch.nn.functional.cosine_similarity(log_spectrum(reference), log_spectrum(candidate), dim=0))
+
+
+def run_profile(name, model_size, duration, threads):
+    """프로필 하나로 모델을 로드해 생성하고 (측정 결과, 생성된 오디오 배치) 반환"""
+    quantize, compile = PROFILES[name]
+    stages = {}
+    profile = CpuProfile(threads=threads, quantize=quantize, compile=compile)
+    with measure(stages, 'load'):
+        generator = LocalEDMGenerator(device='cpu', model_size=model_size, cpu_profile=profile,
+                                      capacity=CapacityModel(path=None))
+
+    settings = dict(BENCHMARK_SETTINGS, duration=duration)
+    decoded = []
+    with measure(stages, 'decode') as record:
+        for segment in generator._iter_decode(BENCHMARK_PROMPTS, settings, None):
+            decoded.append(segment)
+    wav = torch.cat(decoded, dim=-1).cpu()
+    tokens = duration * generator.frame_rate * len(BENCHMARK_PROMPTS)
+    record['tokens'] = tokens
+    record['tokens_per_second'] = round(tokens / record['wall_s'], 2)
+    return {'profile': profile.to_dict(), 'stages': stages}, wav
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU 프로필(fp32 / int8 / compile)별 디코딩 속도와 오디오 유사도 비교")
+    parser.add_argument('--model-size', default='small', choices=list(MODEL_NAMES))
+    parser.add_argument('--duration', type=int, default=8)
+    parser.add_argument('--threads', type=int, default=os.cpu_count())
+    parser.add_argument('--profiles', nargs='+', default=list(PROFILES), choices=list(PROFILES))
+    parser.add_argument('--output', help="결과 JSON 파일 경로 (생략하면 표준 출력)")
+    args = parser.parse_args()
+
+    report = {
+        'environment': {
+            'python': platform.python_version(),
+            'torch': torch.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'model': MODEL_NAMES[args.model_size],
+            'duration': args.duration,
+            'prompts': len(BENCHMARK_PROMPTS),
+        },
+        'results': {},
+    }
+
+    # 첫 번째 프로필(기본 fp32)을 기준으로 유사도 계산
+    reference = None
+    for name in args.profiles:
+        print(f"측정 중: {name}")
+        result, wav = run_profile(name, args.model_size, args.duration, args.threads)
+        if reference is None:
+            reference = wav
+        result['similarity_to_reference'] = [
+            round(spectral_similarity(reference[i], wav[i]), 4) for i in range(len(BENCHMARK_PROMPTS))
+        ]
+        report['results'][name] = result
+    report['reference'] = args.profiles[0]
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+        print(f"결과 저장: {args.output}")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+import os
+from contextlib import contextmanager
+
+import torch
+
+# 모델 크기별 사전 학습 모델 이름
+MODEL_NAMES = {
+    'small': 'facebook/musicgen-small',
+    'medium': 'facebook/musicgen-medium',
+    'melody': 'facebook/musicgen-melody',
+}
+# 사용할 모델 크기 (MUSICGEN_MODEL_SIZE 환경 변수로 변경)
+DEFAULT_MODEL_SIZE = os.environ.get('MUSICGEN_MODEL_SIZE', 'melody')
+
+
+def model_name(size=None):
+    """모델 크기('small', 'medium', 'melody')에 해당하는 사전 학습 모델 이름"""
+    size = size or DEFAULT_MODEL_SIZE
+    if size not in MODEL_NAMES:
+        raise ValueError(f"지원하지 않는 모델 크기입니다: {size} (지원: {', '.join(MODEL_NAMES)})")
+    return MODEL_NAMES[size]
+
+
+@contextmanager
+def seeded(seed, device='cpu'):
+    """
+    with 블록 안의 생성만 seed로 실행하고 끝나면 전역 RNG 상태를 복원하는 컨텍스트
+    (시드를 지정하지 않은 이후 요청이 고정된 난수열을 따르지 않도록 함, seed가 None이면 아무것도 하지 않음)
+    """
+    if seed is None:
+        yield
+        return
+    device = torch.device(device)
+    devices = [device.index or 0] if device.type == 'cuda' else []
+    with torch.random.fork_rng(devices=devices):
+        torch.manual_seed(seed)
+        yield
+
+
+# GPU 디바이스 프로필
+# - launch_blocking: CUDA_LAUNCH_BLOCKING=1 (커널 실행을 모두 동기화, 오류 위치 추적용 디버그 설정)
+# - alloc_conf: PYTORCH_CUDA_ALLOC_CONF (캐싱 할당기 설정)
+# - autocast: LM 가중치와 생성 중 autocast 정밀도 ('float16', 'bfloat16')
+# - tf32 / cudnn_benchmark: 행렬곱 TF32 허용, cuDNN 알고리즘 자동 선택
+DEVICE_PROFILES = {
+    'debug': {
+        'launch_blocking': True,
+        'alloc_conf': 'max_split_size_mb:128',
+        'autocast': 'float16',  # GPU에서 LM 가중치가 float16으로 로드되므로 끄지 않음
+        'tf32': False,
+        'cudnn_benchmark': False,
+    },
+    'balanced': {
+        'launch_blocking': False,
+        'alloc_conf': 'max_split_size_mb:512',
+        'autocast': 'float16',
+        'tf32': True,
+        'cudnn_benchmark': False,
+    },
+    'throughput': {
+        'launch_blocking': False,
+        'alloc_conf': 'expandable_segments:True',
+        'autocast': 'bfloat16',
+        'tf32': True,
+        'cudnn_benchmark': True,
+    },
+}
+# 시작 시 사용할 디바이스 프로필 (DEVICE_PROFILE 환경 변수로 변경)
+DEFAULT_DEVICE_PROFILE = os.environ.get('DEVICE_PROFILE', 'balanced')
+
+
+# CPU 프로필 적용 후 확인용으로 한 번 실행하는 조건부 생성 (짧은 길이)
+SMOKE_CHECK_PROMPT = "smoke check"
+SMOKE_CHECK_DURATION = 0.2
+
+
+def _env_int(name):
+    value = os.environ.get(name)
+    return int(value) if value else None
+
+
+class CpuProfile:
+    """
+    CPU 추론 설정
+    - threads / interop_threads: torch 연산 스레드 수 (None이면 torch 기본값)
+    - quantize: LM 트랜스포머와 출력 헤드의 Linear 레이어를 int8 동적 양자화 (가중치 메모리와 행렬곱 비용 감소)
+      조건기(condition_provider)는 forward에서 output_proj.weight를 텐서로 읽으므로 양자화하지 않음
+    - compile: LM forward(디코딩 스텝)를 torch.compile로 컴파일 (지원하지 않는 환경이면 건너뜀)
+    """
+
+    def __init__(self, threads=None, interop_threads=None, quantize=False, compile=False):
+        self.threads = threads
+        self.interop_threads = interop_threads
+        self.quantize = quantize
+        self.compile = compile
+
+    @classmethod
+    def from_env(cls):
+        """CPU_THREADS, CPU_INTEROP_THREADS, CPU_QUANTIZE(기본 0), CPU_COMPILE(기본 0) 환경 변수로 생성"""
+        return cls(
+            threads=_env_int('CPU_THREADS'),
+            interop_threads=_env_int('CPU_INTEROP_THREADS'),
+            quantize=os.environ.get('CPU_QUANTIZE', '0') == '1',
+            compile=os.environ.get('CPU_COMPILE', '0') == '1',
+        )
+
+    @property
+    def tag(self):
+        """생성 결과가 달라지는 설정을 나타내는 모델 식별자 접미사 (캐시 키 구분용)"""
+        return '+int8' if self.quantize else ''
+
+    def apply_threads(self):
+        """스레드 수 적용 (interop 스레드는 병렬 작업이 시작되기 전에 한 번만 바꿀 수 있음)"""
+        if self.threads:
+            torch.set_num_threads(self.threads)
+        if self.interop_threads:
+            try:
+                torch.set_num_interop_threads(self.interop_threads)
+            except RuntimeError as e:
+                print(f"interop 스레드 수를 바꿀 수 없습니다: {str(e)}")
+
+    def optimize(self, model):
+        """MusicGen 모델의 LM에 양자화/컴파일 적용 후 조건부 생성을 한 번 실행해 확인"""
+        if self.quantize:
+            lm = model.lm
+            lm.transformer = torch.ao.quantization.quantize_dynamic(lm.transformer, {torch.nn.Linear}, dtype=torch.qint8)
+            lm.linears = torch.ao.quantization.quantize_dynamic(lm.linears, {torch.nn.Linear}, dtype=torch.qint8)
+            print("LM 트랜스포머/출력 헤드 Linear 레이어 int8 동적 양자화 적용")
+        if self.compile:
+            if hasattr(torch, 'compile'):
+                model.lm.forward = torch.compile(model.lm.forward, dynamic=True)
+                print("LM 디코딩 스텝 torch.compile 적용")
+            else:
+                print("이 torch 버전은 torch.compile을 지원하지 않아 건너뜁니다")
+        if self.quantize or self.compile:
+            self.smoke_check(model)
+        return model
+
+    def smoke_check(self, model):
+        """
+        프로필을 적용한 모델로 텍스트 조건 생성을 한 번 실행 (조건 인코딩부터 오디오 디코딩까지)
+        양자화/컴파일이 모델 일부를 깨뜨렸으면 첫 요청이 아니라 모델 로드 시점에 예외가 발생함
+        (생성 파라미터는 요청마다 다시 설정되므로 여기서 바꾼 값은 남지 않음)
+        """
+        model.set_generation_params(duration=SMOKE_CHECK_DURATION)
+        with torch.no_grad():
+            wav = model.generate([SMOKE_CHECK_PROMPT])
+        if not torch.isfinite(wav).all():
+            raise RuntimeError(f"CPU 프로필 확인 생성 결과에 유한하지 않은 값이 있습니다: {self.to_dict()}")
+        print(f"CPU 프로필 확인 생성 완료: {tuple(wav.shape)}")
+
+    def to_dict(self):
+        return {
+            'threads': self.threads or torch.get_num_threads(),
+            'interop_threads': self.interop_threads or torch.get_num_interop_threads(),
+            'quantize': self.quantize,
+            'compile': self.compile,
+        }
+
+
+class DeviceProfile:
+    """
+    GPU 추론 설정 묶음 (DEVICE_PROFILES의 'debug', 'balanced', 'throughput')
+    apply_environment()는 CUDA를 초기화하기 전에, configure_model()은 모델을 로드한 뒤에 호출
+    """
+
+    def __init__(self, name=None):
+        name = name or DEFAULT_DEVICE_PROFILE
+        if name not in DEVICE_PROFILES:
+            raise ValueError(f"지원하지 않는 디바이스 프로필입니다: {name} (지원: {', '.join(DEVICE_PROFILES)})")
+        self.name = name
+        self.options = dict(DEVICE_PROFILES[name])
+        self.autocast_dtype = self.options['autocast']
+
+    def apply_environment(self):
+        """CUDA 실행/할당기 환경 변수와 backend 플래그 적용 (이미 설정된 환경 변수는 유지)"""
+        if self.options['launch_blocking']:
+            os.environ['CUDA_LAUNCH_BLOCKING'] = '1'
+        elif os.environ.get('CUDA_LAUNCH_BLOCKING') == '1':
+            print(f"경고: CUDA_LAUNCH_BLOCKING=1이 설정되어 있어 '{self.name}' 프로필에서도 커널 실행이 동기화됩니다")
+        os.environ.setdefault('PYTORCH_CUDA_ALLOC_CONF', self.options['alloc_conf'])
+
+        torch.backends.cuda.matmul.allow_tf32 = self.options['tf32']
+        torch.backends.cudnn.allow_tf32 = self.options['tf32']
+        torch.backends.cudnn.benchmark = self.options['cudnn_benchmark']
+
+    @property
+    def tag(self):
+        """생성 결과가 달라지는 설정(정밀도)을 나타내는 모델 식별자 접미사 (캐시 키 구분용)"""
+        return f"+{self.autocast_dtype}"
+
+    def configure_model(self, model, device):
+        """
+        MusicGen 모델에 autocast 정밀도 적용
+        audiocraft는 GPU에서 LM을 float16으로 로드하므로, 다른 정밀도면 LM 가중치도 같은 정밀도로 변환
+        (autocast가 연산마다 가중치를 변환하지 않도록 함)
+        """
+        if self.autocast_dtype == 'bfloat16' and not torch.cuda.is_bf16_supported():
+            print("이 GPU는 bfloat16을 지원하지 않아 float16 autocast를 사용합니다")
+            self.autocast_dtype = 'float16'
+        dtype = getattr(torch, self.autocast_dtype)
+        lm = getattr(model, 'lm', None)
+        if lm is not None and next(lm.parameters()).dtype != dtype:
+            model.lm = lm.to(dtype)
+            print(f"LM 가중치를 {self.autocast_dtype}로 변환")
+        # MusicGen은 LM 생성을 self.autocast 컨텍스트 안에서 실행함
+        if hasattr(model, 'autocast'):
+            from audiocraft.utils.autocast import TorchAutocast
+            model.autocast = TorchAutocast(
+                enabled=True,
+                device_type=torch.device(device).type,
+                dtype=dtype
+            )
+        return model
+
+    def to_dict(self):
+        return {
+            'device_profile': self.name,
+            'launch_blocking': os.environ.get('CUDA_LAUNCH_BLOCKING') == '1',
+            'alloc_conf': os.environ.get('PYTORCH_CUDA_ALLOC_CONF', ''),
+            'autocast': self.autocast_dtype,
+            'tf32': self.options['tf32'],
+            'cudnn_benchmark': self.options['cudnn_benchmark'],
+        }
@@ -0,0 +1,281 @@
+import multiprocessing
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from batching import GenerationBatcher, MAX_BATCH_SIZE, MAX_WAIT_SECONDS
+from tracing import tracer
+from scheduler import REJECT, DEFER
+from main import render_track_traced, loop_cache, ANIMATION_PATH, VIDEO_BACKEND, LONG_FORM_DEFAULTS
+
+# 파이프라인 기본값
+RENDER_WORKERS = 2          # 라우드니스 정규화 / WAV 저장 / 비디오 합성 프로세스 수
+MAX_PENDING_RENDERS = 4     # 생성 단계와 렌더링 단계 사이 큐의 최대 길이
+JOB_TTL_SECONDS = 1800      # 끝난 작업 기록을 보관하는 시간 (결과물 정리와 별개로 적용)
+
+# TRACE_JOBS=1이면 작업마다 Chrome trace JSON(trace.json)을 결과물 디렉토리에 저장
+TRACE_JOBS = os.environ.get('TRACE_JOBS') == '1'
+
+# 작업 상태
+QUEUED = 'queued'
+GENERATING = 'generating'
+RENDERING = 'rendering'
+DONE = 'done'
+FAILED = 'failed'
+REJECTED = 'rejected'
+
+
+class Job:
+    """웹 UI가 ID로 조회하는 생성 작업 하나의 상태"""
+
+    def __init__(self, prompt, settings):
+        self.id = uuid.uuid4().hex
+        self.prompt = prompt
+        self.settings = settings
+        self.status = QUEUED
+        self.progress = 0.0
+        self.desc = "대기 중..."
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self.expected_wait = 0.0   # 제출 시점의 예상 대기 시간(초)
+        self.expected_cost = None  # 예상 디코딩 시간(초)
+        self._done = threading.Event()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """작업이 끝날 때까지 기다린 뒤 결과(비디오 경로 또는 None) 반환"""
+        self._done.wait(timeout)
+        return self.result
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'progress': self.progress,
+            'desc': self.desc,
+            'result': self.result,
+            'error': self.error,
+            'created': self.created,
+            'finished': self.finished,
+            'expected_wait': self.expected_wait,
+            'expected_cost': self.expected_cost,
+        }
+
+
+class JobManager:
+    """
+    GPU 생성과 CPU 렌더링을 분리한 파이프라인 작업 관리자
+    - 생성 단계: GenerationBatcher의 워커 스레드만 generator.model을 사용
+      (generation_workers개, 모델 복제본 풀을 쓰면 복제본 수만큼 동시에 생성)
+    - 렌더링 단계: 프로세스 풀에서 render_track 실행 (정규화, WAV 저장, 비디오 합성)
+    - 두 단계 사이는 MAX_PENDING_RENDERS 크기의 제한 큐로 연결되어,
+      렌더링이 밀리면 생성 단계가 대기함 (메모리에 쌓이는 오디오 수 제한)
+    - scheduler(CostScheduler)가 있으면 예상 비용 순으로 실행하고, 지연 한도를 넘는 요청은 거절하거나 미룸
+    - 끝난 지 job_ttl초가 지난 작업 기록은 새 작업을 등록할 때 삭제
+      (거절/캐시 적중/output_dir 지정 작업처럼 아티팩트 정리로 forget되지 않는 작업 포함)
+    """
+
+    def __init__(self, generator, render_workers=RENDER_WORKERS, max_pending_renders=MAX_PENDING_RENDERS,
+                 max_batch_size=MAX_BATCH_SIZE, max_wait=MAX_WAIT_SECONDS, result_cache=None, artifact_store=None,
+                 scheduler=None, generation_workers=1, job_ttl=JOB_TTL_SECONDS):
+        self.generator = generator
+        self.job_ttl = job_ttl
+        self.result_cache = result_cache
+        self.artifact_store = artifact_store  # 있으면 작업 ID별 디렉토리에 결과물 저장
+        # CUDA를 초기화한 부모를 fork하지 않도록 spawn 사용
+        self._render_pool = ProcessPoolExecutor(
+            max_workers=render_workers,
+            mp_context=multiprocessing.get_context('spawn')
+        )
+        self._render_slots = threading.BoundedSemaphore(max_pending_renders)
+        self.scheduler = scheduler
+        self.batcher = GenerationBatcher(generator, max_batch_size, max_wait, render=self._submit_render,
+                                         scheduler=scheduler, workers=generation_workers)
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, prompt, settings, progress_callback=None, on_audio=None, output_dir=None):
+        """
+        작업을 등록하고 Job을 반환 (job.id로 나중에 조회 가능)
+        output_dir를 주면 아티팩트 저장소 대신 해당 디렉토리에 결과물 저장
+        """
+        job = Job(prompt, dict(settings))
+        with self._lock:
+            self._prune(job.created)
+            self._jobs[job.id] = job
+        
+        # 같은 요청의 최종 MP4가 캐시에 있으면 생성/렌더링 없이 바로 완료
+        video_key = self._video_key(job)
+        if video_key is not None:
+            cached = self.result_cache.get(video_key, '.mp4')
+            if cached is not None:
+                print(f"캐시된 비디오 사용: {cached}")
+                self._finish(job, cached, None, progress_callback)
+                return job
+        
+        # 승인 제어: 예상 대기 + 디코딩 시간이 지연 한도를 넘으면 거절하거나 뒤로 미룸
+        deferred = False
+        if self.scheduler is not None:
+            job.expected_cost = self.scheduler.cost(job.settings)
+            job.expected_wait = self.batcher.expected_wait(job.settings)
+            decision = self.scheduler.admit(job.expected_cost, job.expected_wait)
+            if decision == REJECT:
+                self._reject(job)
+                return job
+            deferred = decision == DEFER
+            if deferred:
+                job.expected_wait = self.batcher.expected_wait(job.settings, deferred=True)
+            job.desc = f"대기 중... 예상 대기 약 {job.expected_wait:.0f}초"
+            if deferred:
+                job.desc += " (지연 한도 초과로 뒤로 미뤄짐)"
+            if progress_callback is not None:
+                progress_callback(0.0, desc=job.desc)
+
+        def progress(value, desc=""):
+            job.status = GENERATING
+            # 생성 단계의 '완료'는 렌더링 전이므로 최종 완료는 렌더링 후에 알림
+            if value >= 1.0:
+                return
+            job.progress, job.desc = value, desc
+            if progress_callback is not None:
+                progress_callback(value, desc=desc)
+
+        def on_generated(future):
+            try:
+                render_future = future.result()
+            except Exception as e:
+                self._finish(job, None, e, progress_callback)
+                return
+            job.status = RENDERING
+            job.desc = "비디오 생성 중..."
+            render_future.add_done_callback(on_rendered)
+
+        def on_rendered(future):
+            error = future.exception()
+            result = None
+            if error is None:
+                # 렌더링 프로세스에서 기록한 스팬을 이 작업에 연결
+                result, spans = future.result()
+                for span in spans:
+                    tracer.record(span, job_ids=[job.id])
+            if result is not None and video_key is not None:
+                try:
+                    self.result_cache.put_file(video_key, '.mp4', result)
+                except OSError as e:
+                    print(f"결과 캐시 저장 실패: {str(e)}")
+            self._finish(job, result, error, progress_callback)
+
+        if output_dir is not None:
+            os.makedirs(output_dir, exist_ok=True)
+        elif self.artifact_store is not None:
+            output_dir = self.artifact_store.create(job.id)
+        future = self.batcher.submit(prompt, job.settings, progress, on_audio, output_dir, job.id, deferred)
+        future.add_done_callback(on_generated)
+        return job
+
+    def get(self, job_id):
+        """작업 ID로 Job 조회 (없으면 None)"""
+        return self._jobs.get(job_id)
+
+    def status(self, job_id):
+        """작업 ID의 상태를 딕셔너리로 반환 (없으면 None)"""
+        job = self.get(job_id)
+        return job.to_dict() if job else None
+
+    def forget(self, job_id):
+        """작업 기록 삭제 (결과물이 정리될 때 호출)"""
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def _prune(self, now):
+        """끝난 지 job_ttl초가 지난 작업 기록 삭제 (self._lock을 잡은 상태에서 호출)"""
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished is not None and now - job.finished > self.job_ttl]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def _video_key(self, job):
+        """시드가 지정된 작업의 비디오 캐시 키 (캐시 대상이 아니면 None)"""
+        if self.result_cache is None or not self.result_cache.cacheable(job.settings):
+            return None
+        generation_key = self.result_cache.generation_key(
+            job.prompt, job.settings, self.generator.model_id, LONG_FORM_DEFAULTS
+        )
+        return self.result_cache.video_key(
+            generation_key,
+            loop_cache.source_hash(ANIMATION_PATH),
+            job.settings.get('video_backend') or VIDEO_BACKEND,
+            job.settings.get('beat_sync', False),
+            job.settings.get('bpm')
+        )
+
+    def _submit_render(self, wav, base_filename, video_backend=None, beat_bpm=None):
+        """생성 워커에서 호출: 렌더링 슬롯이 날 때까지 기다린 뒤 프로세스 풀에 제출"""
+        self._render_slots.acquire()
+        try:
+            future = self._render_pool.submit(
+                render_track_traced, wav.cpu().numpy(), self.generator.model.sample_rate, base_filename, video_backend,
+                beat_bpm=beat_bpm
+            )
+        except Exception:
+            self._render_slots.release()
+            raise
+        future.add_done_callback(lambda _: self._render_slots.release())
+        return future
+
+    def _reject(self, job):
+        job.status = REJECTED
+        job.finished = time.time()
+        job.error = (
+            f"예상 소요 시간(대기 약 {job.expected_wait:.0f}초 + 생성 약 {job.expected_cost:.0f}초)이 "
+            f"허용 한도 {self.scheduler.latency_budget:.0f}초를 넘어 요청을 받을 수 없습니다. "
+            "길이를 줄이거나 잠시 후 다시 시도하세요."
+        )
+        job.desc = "거절됨"
+        print(f"작업 {job.id} 거절: {job.error}")
+        tracer.increment('jobs_total', status=job.status)
+        job._done.set()
+
+    def _finish(self, job, result, error, progress_callback):
+        # 성공/실패와 관계없이 결과물 작성이 끝났음을 기록 (이때부터 결과물 TTL 계산)
+        if self.artifact_store is not None:
+            self.artifact_store.commit(job.id)
+        job.result = result
+        job.finished = time.time()
+        if error is not None or result is None:
+            job.status = FAILED
+            job.error = str(error) if error is not None else "비디오 생성 실패"
+            print(f"작업 {job.id} 실패: {job.error}")
+            if error is not None:
+                traceback.print_exception(type(error), error, error.__traceback__)
+        else:
+            job.status = DONE
+            job.progress, job.desc = 1.0, "완료!"
+            if progress_callback is not None:
+                try:
+                    progress_callback(1.0, desc="완료!")
+                except:
+                    pass
+        tracer.increment('jobs_total', status=job.status)
+        if TRACE_JOBS:
+            self._dump_trace(job)
+        job._done.set()
+
+    def _dump_trace(self, job):
+        directory = self.artifact_store.path(job.id) if self.artifact_store is not None else None
+        path = os.path.join(directory, "trace.json") if directory else f"trace_{job.id}.json"
+        try:
+            tracer.dump_chrome_trace(job.id, path)
+        except OSError as e:
+            print(f"트레이스 저장 실패: {str(e)}")
+
+    def shutdown(self):
+        self._render_pool.shutdown(wait=False)
@@ -1,6 +1,5 @@
 import torch
 from audiocraft.models import MusicGen
-from audiocraft.data.audio import audio_write
 import datetime
 import numpy as np
 import os
@@ -11,6 +10,16 @@ from moviepy.editor import VideoFileClip, concatenate_videoclips, AudioFileClip,
 import time
 import random
 import traceback
+import uuid
+from contextlib import nullcontext
+from video_cache import (LoopAssetCache, mux_looped_video, mux_looped_pcm, beat_cycle, media_duration,
+                         pingpong_index_map, stream_frame_map, LOOP_FPS)
+from tracing import tracer
+from capacity import CapacityModel, DecodeProgress, DEFAULT_FRAME_RATE
+from device_profile import CpuProfile, DeviceProfile, model_name, seeded
+from conditioning_cache import ConditioningCache
+from chroma_store import ChromaStore
+from audio_post import measure_loudness, loudness_gain, write_wav, encode_audio, estimate_tempo, AUDIO_FORMATS
 
 # 모든 경고 메시지 숨기기
 warnings.filterwarnings('ignore')
@@ -193,31 +202,120 @@ future_funk_prompts = [
     "modern electronic production, dance groove"
 ]
 
+# 롱폼 생성 설정
+# duration이 LONG_FORM_WINDOW보다 길면 윈도우 단위로 나눠 생성하고,
+# 각 윈도우는 이전 윈도우의 마지막 LONG_FORM_OVERLAP초를 이어받아(generate_continuation) 생성
+LONG_FORM_WINDOW = 30    # 한 번에 디코딩할 윈도우 길이(초)
+LONG_FORM_OVERLAP = 5    # 윈도우 간 겹침 및 크로스페이드 길이(초)
+LONG_FORM_DEFAULTS = {'window_duration': LONG_FORM_WINDOW, 'window_overlap': LONG_FORM_OVERLAP}
+
+def crossfade(tail, head):
+    """이전 윈도우의 끝부분과 다음 윈도우의 앞부분을 선형 크로스페이드로 합치는 함수"""
+    length = min(tail.shape[-1], head.shape[-1])
+    fade_in = torch.linspace(0.0, 1.0, length, device=head.device, dtype=head.dtype)
+    return tail[..., :length] * (1.0 - fade_in) + head[..., :length] * fade_in
+
+def to_playable_pcm(wav):
+    """[채널, 샘플] 오디오 텐서를 재생용 int16 배열 [샘플, 채널]로 변환하는 함수"""
+    return (wav.clamp(-1.0, 1.0).numpy().T * 32767).astype(np.int16)
+
+def _progress_updater(progress_callback):
+    """progress_callback 호출 실패가 생성을 중단시키지 않도록 감싸는 함수"""
+    def update_progress(value, desc=""):
+        if progress_callback is not None:
+            try:
+                progress_callback(value, desc=desc)
+            except:
+                print(f"Progress update: {value} - {desc}")
+    return update_progress
+
+# 비디오 합성 백엔드
+# - 'ffmpeg': 캐시된 루프 영상을 스트림 복사로 반복하고 오디오만 인코딩 (프레임 렌더링 없음)
+# - 'frames': 한 번 디코딩해 둔 원본 프레임 배열을 프레임 번호 맵 순서대로 인코더 파이프에 바로 전달
+# - 'moviepy': MoviePy로 모든 프레임을 렌더링해 재인코딩 (역재생 프레임마다 디코더 탐색, 마지막 대체 경로)
+VIDEO_BACKENDS = ('ffmpeg', 'frames', 'moviepy')
+VIDEO_BACKEND = os.environ.get('VIDEO_BACKEND', 'ffmpeg')
+if VIDEO_BACKEND not in VIDEO_BACKENDS:
+    raise ValueError(f"지원하지 않는 비디오 백엔드입니다: {VIDEO_BACKEND} (지원: {', '.join(VIDEO_BACKENDS)})")
+
+# MP4와 함께 저장할 압축 오디오 결과물 형식 ('opus', 'mp3', 'flac', 없으면 저장하지 않음)
+AUDIO_DELIVERABLE = os.environ.get('AUDIO_DELIVERABLE') or None
+if AUDIO_DELIVERABLE is not None and AUDIO_DELIVERABLE not in AUDIO_FORMATS:
+    raise ValueError(f"지원하지 않는 오디오 형식입니다: {AUDIO_DELIVERABLE} (지원: {', '.join(AUDIO_FORMATS)})")
+
+# 기본 애니메이션 파일
+ANIMATION_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "youtube_gif_new.mp4")
+
 class LocalEDMGenerator:
-    def __init__(self):
-        # CUDA 설정
-        os.environ['CUDA_LAUNCH_BLOCKING'] = '1'
-        os.environ['PYTORCH_CUDA_ALLOC_CONF'] = 'max_split_size_mb:128'
+    def __init__(self, model=None, result_cache=None, device=None, model_size=None, cpu_profile=None,
+                 device_profile=None, capacity=None):
+        # 시드가 지정된 요청의 디코딩 결과를 재사용하는 캐시 (result_cache.ResultCache)
+        self.result_cache = result_cache
+        # 배치 크기별 디코딩 속도 기록 (스케줄러의 작업 비용 예측에 사용)
+        # 측정 도구는 CapacityModel(path=None)을 넘겨 서비스용 기록 파일에 쓰지 않음
+        self.capacity = capacity if capacity is not None else CapacityModel()
+        # 양자화, GPU 정밀도 등 생성 결과를 바꾸는 설정을 모델 식별자에 덧붙이는 접미사
+        self.model_tag = ''
+        self.cpu_profile = None
+        self.device_profile = None
+        # 텍스트/멜로디 조건 인코딩 결과 캐시 (로컬 MusicGen 모델에만 연결)
+        self.conditioning_cache = None
+        # 레퍼런스 오디오의 크로마 특징 저장소 (멜로디 조건이 있는 로컬 모델에만 연결)
+        self.chroma_store = None
         
-        if torch.cuda.is_available():
-            torch.cuda.empty_cache()
-            torch.backends.cuda.matmul.allow_tf32 = True
-            torch.backends.cudnn.allow_tf32 = True
-            
-        self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        # model을 주면(모델 서버 클라이언트, 스텁 모델 등) 로컬 모델을 로드하지 않고 그대로 사용
+        if model is not None:
+            self.model = model
+            self.device = getattr(model, 'device', 'cpu')
+            self.capacity.select(self.model_id, self.device)
+            print(f"외부 모델 사용: {getattr(model, 'name', type(model).__name__)}")
+            return
+        
+        # device를 주면(예: 'cuda:1') 해당 디바이스 사용 (복제본 풀에서 디바이스별로 모델을 올릴 때)
+        self.device = device or ('cuda' if torch.cuda.is_available() else 'cpu')
         print(f"사용중인 디바이스: {self.device}")
         
+        # GPU에서는 디바이스 프로필(debug/balanced/throughput)을 CUDA 초기화 전에 적용
+        # CPU에서는 스레드 수, int8 양자화, torch.compile 설정 적용 (device_profile.CpuProfile)
+        if self.device == 'cpu':
+            self.cpu_profile = cpu_profile or CpuProfile.from_env()
+            self.cpu_profile.apply_threads()
+        else:
+            self.device_profile = device_profile or DeviceProfile()
+            self.device_profile.apply_environment()
+            torch.cuda.empty_cache()
+        
         try:
-            print("모델 로딩 중...")
+            name = model_name(model_size)
+            print(f"모델 로딩 중... ({name})")
             # device 파라미터로 직접 지정
             self.model = MusicGen.get_pretrained(
-                'facebook/musicgen-melody',
+                name,
                 device=self.device
             )
             
-            # 모델 설정
-            if hasattr(self.model, 'lm'):
-                self.model.lm.cfg.use_cache = True
+            # 모델 설정 (프로필을 메트릭의 info 레이블로 노출)
+            if self.cpu_profile is not None:
+                self.cpu_profile.optimize(self.model)
+                self.model_tag = self.cpu_profile.tag
+                profile_info = dict(self.cpu_profile.to_dict(), device_profile='cpu')
+            else:
+                self.device_profile.configure_model(self.model, self.device)
+                self.model_tag = self.device_profile.tag
+                profile_info = self.device_profile.to_dict()
+            self.capacity.select(self.model_id, self.device)
+            print(f"디바이스 프로필: {profile_info}")
+            tracer.set_info(device=self.device, model=name, **profile_info)
+            
+            self.conditioning_cache = ConditioningCache()
+            cached_conditions = self.conditioning_cache.install(self.model)
+            print(f"조건 캐시 연결: {', '.join(cached_conditions) or '없음'}")
+            
+            # 조건 캐시보다 바깥에 연결해 저장된 크로마는 캐시 조회 없이 바로 사용
+            chroma_store = ChromaStore()
+            if chroma_store.install(self.model):
+                self.chroma_store = chroma_store
+                print(f"크로마 저장소 연결: {chroma_store.store_dir}")
                 
             print("모델 로딩 완료")
             
@@ -225,38 +323,11 @@ class LocalEDMGenerator:
             print(f"모델 로드 중 오류 발생: {str(e)}")
             raise
 
-    def process_video(self, audio_filename):
+    def process_video(self, audio_filename, backend=None):
         try:
             print("영상 처리 중...")
-            # 원본 비디오 로드
-            video = VideoFileClip("./youtube_gif_new.mp4")
-            
-            # 역재생 비디오 생성
-            reversed_video = video.fx(vfx.time_mirror)
-            
-            # 정방향 + 역방향 비디오 연결
-            final_video = concatenate_videoclips([video, reversed_video])
-            
-            # 8초 영상을 음악 길이만큼 반복
-            audio = AudioFileClip(f"{audio_filename}.wav")
-            num_loops = int(np.ceil(audio.duration / 8))
-            
-            # 비디오 반복 및 음악 결합
-            final_video = concatenate_videoclips([final_video] * num_loops).subclip(0, audio.duration)
-            final_video = final_video.set_audio(audio)
-            
-            # 최종 파일 저장
             output_filename = f"{audio_filename}_with_video.mp4"
-            final_video.write_videofile(output_filename, 
-                                      codec='libx264', 
-                                      audio_codec='aac',
-                                      fps=24)
-            
-            # 리소스 정리
-            video.close()
-            reversed_video.close()
-            final_video.close()
-            audio.close()
+            render_video(f"{audio_filename}.wav", output_filename, backend)
             
             print(f"\n최종 영상이 생성되었습니다: {output_filename}")
             return True
@@ -265,19 +336,22 @@ class LocalEDMGenerator:
             print(f"영상 처리 중 오류 발생: {str(e)}")
             return False
 
-    def generate_track(self, prompt, settings, progress_callback=None):
-        try:
-            # progress_callback 처리 방식 수정
-            def update_progress(value, desc=""):
-                if progress_callback is not None:
-                    try:
-                        progress_callback(value, desc=desc)
-                    except:
-                        print(f"Progress update: {value} - {desc}")
-
-            update_progress(0.1, "모델 준비 중...")
-            
-            # 모델 설정
+    @property
+    def model_id(self):
+        """캐시 키 등에 쓰는 모델 식별자"""
+        return getattr(self.model, 'name', type(self.model).__name__) + self.model_tag
+
+    def warm_conditioning(self, prompts):
+        """자주 쓰는 프롬프트(장르 기본 프롬프트 등)의 텍스트 조건을 미리 인코딩해 캐시에 저장"""
+        if self.conditioning_cache is None:
+            return 0
+        with tracer.span('conditioning_warmup') as span:
+            span['prompts'] = self.conditioning_cache.warm(self.model, prompts)
+        return span['prompts']
+
+    def _set_generation_params(self, settings):
+        """설정 딕셔너리의 생성 파라미터를 모델에 적용"""
+        with tracer.span('model_params'):
             self.model.set_generation_params(
                 duration=settings['duration'],
                 temperature=settings['temperature'],
@@ -285,83 +359,398 @@ class LocalEDMGenerator:
                 top_p=settings['top_p'],
                 cfg_coef=settings['cfg_coef']
             )
+
+    @property
+    def frame_rate(self):
+        """초당 토큰 프레임 수"""
+        return getattr(self.model, 'frame_rate', DEFAULT_FRAME_RATE)
+
+    def _decode_span(self, prompts, duration, window=0):
+        """디코딩 스팬 (생성할 토큰 수를 함께 기록해 초당 토큰 수 계산)"""
+        return tracer.span('decode', batch=len(prompts), window=window, tokens=int(duration * self.frame_rate) * len(prompts))
+
+    def _seeded(self, settings, window_index):
+        """
+        시드가 지정된 요청의 generate 호출 하나를 결정적으로 실행하는 컨텍스트 (윈도우마다 seed + 윈도우 번호)
+        원격 모델(모델 서버, 복제본 풀)은 시드를 요청에 담아 서버에서 적용하고,
+        로컬 모델은 전역 RNG를 건드리지 않도록 분기한 RNG 상태에서 실행
+        """
+        seed = settings.get('seed')
+        if seed is not None:
+            seed += window_index
+        if hasattr(self.model, 'seeded'):
+            return self.model.seeded(seed)
+        return seeded(seed, self.device)
+
+    def _set_progress_callback(self, callback):
+        """MusicGen의 스텝별 진행 콜백 등록 (지원하지 않는 모델은 무시)"""
+        if hasattr(self.model, 'set_custom_progress_callback'):
+            self.model.set_custom_progress_callback(callback)
+
+    def iter_long_form(self, prompts, settings, tracker=None):
+        """
+        긴 트랙을 고정 길이 윈도우로 나눠 생성하며 완성된 구간을 순서대로 반환하는 제너레이터
+        - 각 윈도우는 이전 윈도우의 끝부분(overlap)을 프롬프트로 generate_continuation 호출
+        - 겹치는 구간은 크로스페이드 후 다음 구간의 앞부분으로 반환
+        - 반환되는 구간은 CPU 텐서 [배치, 채널, 샘플]이며 이어 붙이면 duration 길이가 됨
+        디바이스 메모리 사용량은 트랙 길이가 아니라 윈도우 길이에 비례
+        tracker(DecodeProgress)를 주면 윈도우마다 진행률 계산 범위를 알려줌
+        """
+        window = settings.get('window_duration', LONG_FORM_WINDOW)
+        overlap = settings.get('window_overlap', LONG_FORM_OVERLAP)
+        if not 0 < overlap < window:
+            raise ValueError(f"윈도우 겹침은 0보다 크고 윈도우 길이({window}초)보다 작아야 합니다: {overlap}")
+
+        sample_rate = self.model.sample_rate
+        total_samples = int(settings['duration'] * sample_rate)
+        overlap_samples = int(overlap * sample_rate)
+        params = dict(settings)
+
+        # 첫 윈도우는 일반 텍스트 조건 생성
+        params['duration'] = min(window, settings['duration'])
+        self._set_generation_params(params)
+        if tracker is not None:
+            tracker.start_window(int(params['duration'] * self.frame_rate))
+        with self._decode_span(prompts, params['duration']), self._seeded(settings, 0):
+            segment = self.model.generate(prompts)
+        if tracker is not None:
+            tracker.finish_window()
+        produced = 0
+        window_index = 0
+
+        while True:
+            if produced + segment.shape[-1] >= total_samples:
+                # 마지막 구간: 목표 길이에 맞춰 자르고 종료
+                yield segment[..., :total_samples - produced].cpu()
+                return
+
+            # 끝부분은 다음 윈도우와 크로스페이드하기 위해 보류
+            tail = segment[..., -overlap_samples:]
+            body = segment[..., :-overlap_samples]
+            produced += body.shape[-1]
+            yield body.cpu()
+            del segment, body
+
+            # 다음 윈도우: 보류한 끝부분을 이어받아 생성 (출력에 프롬프트 구간 포함)
+            # 프레임 반올림으로 남은 길이가 겹침과 거의 같아도 최소 1초는 새로 생성
+            remaining = (total_samples - produced) / sample_rate
+            params['duration'] = min(window, max(remaining, overlap + 1))
+            self._set_generation_params(params)
+            window_index += 1
+            if tracker is not None:
+                prompt_steps = int(tail.shape[-1] / sample_rate * self.frame_rate)
+                tracker.start_window(int(params['duration'] * self.frame_rate) - prompt_steps)
+            with self._decode_span(prompts, params['duration'] - overlap, window_index), \
+                    self._seeded(settings, window_index):
+                continuation = self.model.generate_continuation(
+                    tail,
+                    prompt_sample_rate=sample_rate,
+                    descriptions=prompts
+                )
+            if tracker is not None:
+                tracker.finish_window()
+            head = crossfade(tail, continuation[..., :tail.shape[-1]])
+            segment = torch.cat([head, continuation[..., tail.shape[-1]:]], dim=-1)
+            del tail, continuation, head
+
+    def _iter_decode(self, prompts, settings, progress=None):
+        """
+        설정 길이에 따라 한 번에 또는 롱폼 윈도우 단위로 디코딩하며 CPU 구간을 순서대로 반환
+        디코딩 중에는 스텝 단위 진행률/초당 토큰 수/남은 시간을 progress로 보고하고,
+        끝나면 디코딩 속도를 self.capacity에 기록
+        """
+        tracker = DecodeProgress(int(settings['duration'] * self.frame_rate), len(prompts), progress)
+        self._set_progress_callback(tracker)
+        try:
+            with self._melody_condition(prompts, settings):
+                window = settings.get('window_duration', LONG_FORM_WINDOW)
+                if settings['duration'] <= window:
+                    self._set_generation_params(settings)
+                    tracker.start_window(tracker.total_steps)
+                    with self._decode_span(prompts, settings['duration']), self._seeded(settings, 0):
+                        wav = self.model.generate(prompts).cpu()
+                    tracker.finish_window()
+                    yield wav
+                else:
+                    for segment in self.iter_long_form(prompts, settings, tracker):
+                        yield segment
+        finally:
+            self._set_progress_callback(None)
+        
+        self.capacity.record(len(prompts), tracker.done_steps, tracker.elapsed)
+
+    def _melody_condition(self, prompts, settings):
+        """
+        settings['reference_audio']가 있으면 배치의 모든 프롬프트에 레퍼런스 오디오의 크로마를 멜로디 조건으로 지정
+        크로마는 저장소에 없을 때만 추출하고, 이후에는 메모리 매핑된 특징을 그대로 사용
+        """
+        reference_audio = settings.get('reference_audio')
+        if not reference_audio:
+            return nullcontext()
+        if self.chroma_store is None:
+            raise ValueError("레퍼런스 오디오 조건 생성은 멜로디 모델(musicgen-melody)을 로컬로 로드했을 때만 지원됩니다")
+        key = self.chroma_store.prepare(reference_audio)
+        return self.chroma_store.using([key] * len(prompts))
+
+    def _save_track(self, wav, base_filename, video_backend=None, beat_bpm=None):
+        """생성된 오디오를 저장하고 비디오를 만들어 비디오 경로 반환"""
+        return render_track(wav.cpu().numpy(), self.model.sample_rate, base_filename, video_backend, beat_bpm=beat_bpm)
+
+    def stream_tracks(self, prompts, settings, progress_callback=None, render=None, output_dirs=None):
+        """
+        여러 프롬프트를 한 번의 generate 호출로 배치 생성하며 진행 상황을 이벤트로 반환하는 제너레이터
+        - ('audio', 인덱스, (sample_rate, int16 배열)): 디코딩이 끝난 구간 (롱폼은 윈도우마다)
+        - ('video', 인덱스, 비디오 경로 또는 None): 최종 MP4 생성 결과
+        스트리밍 구간은 라우드니스 정규화 전의 오디오이며, 최종 MP4에는 정규화된 오디오가 들어감
+        render(wav, base_filename, video_backend, beat_bpm)를 주면 저장/비디오 생성을 대신 맡기며,
+        'video' 이벤트에는 render의 반환값(예: 렌더링 작업의 Future)이 그대로 담김
+        output_dirs를 주면 프롬프트별로 해당 디렉토리에 결과물을 저장
+        settings['beat_sync']가 켜져 있으면 settings['bpm']을 사전 템포로 비트 정렬 비디오를 만듦
+        """
+        prompts = list(prompts)
+        render = render or self._save_track
+        update_progress = _progress_updater(progress_callback)
+
+        update_progress(0.1, "모델 준비 중...")
+        
+        update_progress(0.3, "음악 생성 중...")
+        
+        # 시드가 지정된 요청은 캐시된 디코딩 결과 재사용
+        cache_keys = None
+        cached = None
+        if self.result_cache is not None and self.result_cache.cacheable(settings):
+            cache_keys = [
+                self.result_cache.generation_key(prompt, settings, self.model_id, LONG_FORM_DEFAULTS)
+                for prompt in prompts
+            ]
+            cached = [self.result_cache.get_audio(key) for key in cache_keys]
+        
+        if cached and all(audio is not None for audio in cached):
+            print("캐시된 오디오 사용")
+            wav = torch.from_numpy(np.stack(cached))
+            for i in range(len(prompts)):
+                yield 'audio', i, (self.model.sample_rate, to_playable_pcm(wav[i]))
+        else:
+            # 음악 생성 (배치 전체를 한 번에 디코딩, 긴 트랙은 윈도우 단위로 이어서 생성)
+            segments = []
+            for segment in self._iter_decode(prompts, settings, update_progress):
+                segments.append(segment)
+                for i in range(len(prompts)):
+                    yield 'audio', i, (self.model.sample_rate, to_playable_pcm(segment[i]))
+            wav = torch.cat(segments, dim=-1)
+            del segments
             
-            update_progress(0.3, "음악 생성 중...")
-            
-            # 음악 생성
-            wav = self.model.generate([prompt])
-            
-            update_progress(0.6, "오디오 저장 중...")
-            
-            # 파일명 생성
+            if cache_keys is not None:
+                for i, key in enumerate(cache_keys):
+                    self.result_cache.put_audio(key, wav[i].float().numpy())
+        
+        update_progress(0.6, "오디오 저장 중...")
+        
+        # 파일명 생성
+        # output_dirs가 있으면 작업별 디렉토리에, 없으면 현재 디렉토리에 고유 접미사를 붙여 저장
+        if output_dirs is not None:
+            base_filenames = [os.path.join(directory, settings['genre']) for directory in output_dirs]
+        else:
             timestamp = int(time.time())
-            base_filename = f"{settings['genre']}_{timestamp}"
-            audio_path = os.path.join(os.getcwd(), f"{base_filename}.wav")
-            video_path = os.path.join(os.getcwd(), f"{base_filename}_with_video.mp4")
-            
-            # 오디오 저장
-            audio_write(
-                base_filename, 
-                wav[0].cpu(), 
-                self.model.sample_rate, 
-                strategy="loudness",
-                loudness_compressor=True
-            )
-            
-            update_progress(0.8, "비디오 생성 중...")
-            
-            # 비디오 생성
-            success = create_video_with_audio(audio_path, video_path)
-            
-            if success and os.path.exists(video_path):
-                update_progress(1.0, "완료!")
-                return video_path
-            else:
-                print("비디오 생성 실패")
-                return None
+            base_filenames = [f"{settings['genre']}_{timestamp}_{uuid.uuid4().hex[:8]}" for _ in prompts]
+        
+        update_progress(0.8, "비디오 생성 중...")
+        
+        completed = False
+        beat_bpm = settings.get('bpm') if settings.get('beat_sync') else None
+        for i in range(len(prompts)):
+            video_path = render(wav[i], base_filenames[i], settings.get('video_backend'), beat_bpm)
+            completed = completed or video_path is not None
+            yield 'video', i, video_path
+        
+        if completed:
+            update_progress(1.0, "완료!")
+
+    def generate_tracks(self, prompts, settings, progress_callback=None):
+        """
+        여러 프롬프트를 한 번의 generate 호출로 배치 생성
+        모든 프롬프트는 같은 생성 파라미터(settings)를 공유하며,
+        프롬프트 순서대로 비디오 경로(실패 시 None) 리스트를 반환
+        """
+        prompts = list(prompts)
+        results = [None] * len(prompts)
+        try:
+            for kind, index, payload in self.stream_tracks(prompts, settings, progress_callback):
+                if kind == 'video':
+                    results[index] = payload
+            return results
             
         except Exception as e:
             print(f"트랙 생성 중 오류 발생: {str(e)}")
             traceback.print_exc()
-            return None
+            return results
+
+    def stream_track(self, prompt, settings, progress_callback=None):
+        """
+        단일 프롬프트 트랙 생성의 제너레이터 버전
+        디코딩된 오디오 구간마다 ('audio', (sample_rate, int16 배열))을,
+        마지막에 ('video', 비디오 경로 또는 None)을 반환
+        """
+        for kind, _, payload in self.stream_tracks([prompt], settings, progress_callback):
+            yield kind, payload
+
+    def generate_track(self, prompt, settings, progress_callback=None, reference_audio=None):
+        """
+        단일 프롬프트로 트랙 생성 (generate_tracks의 배치 크기 1 버전)
+        reference_audio(오디오 파일 경로)를 주면 generate_with_chroma와 같음
+        """
+        if reference_audio:
+            settings = dict(settings, reference_audio=reference_audio)
+        return self.generate_tracks([prompt], settings, progress_callback)[0]
+
+    def generate_with_chroma(self, prompt, reference_audio, settings, progress_callback=None):
+        """레퍼런스 오디오의 멜로디(크로마)와 프롬프트로 트랙 생성"""
+        return self.generate_track(prompt, settings, progress_callback, reference_audio)
 
 def create_reversed_clip(clip):
     """비디오 클립을 역재생으로 만드는 함수"""
     return clip.set_make_frame(lambda t: clip.get_frame(clip.duration - t))
 
-def create_video_with_audio(audio_path, output_path):
-    try:
+def beat_plan(wav, sample_rate, beat_bpm):
+    """
+    오디오의 비트를 추적해 루프 한 세트가 비트 경계마다 시작하도록 하는 (한 세트 길이, 시작 오프셋)(초) 반환
+    beat_bpm은 비트 추적의 사전 템포 (장르 설정의 BPM)
+    """
+    with tracer.span('beat_track', samples=wav.shape[-1]) as span:
+        tempo, beats = estimate_tempo(wav, sample_rate, start_bpm=beat_bpm or 120.0)
+        span['bpm'] = tempo
+    cycle, offset = beat_cycle(2 * media_duration(ANIMATION_PATH), beats, tempo)
+    print(f"비트 정렬: 추정 {tempo:.1f} BPM, 루프 한 세트 {cycle:.3f}초, 시작 오프셋 {offset:.2f}초")
+    return cycle, offset
+
+def beat_aligned_loop(wav, sample_rate, beat_bpm, loop_path):
+    """루프 한 세트가 비트 경계마다 시작하도록 늘리고 돌려 놓은 루프 영상을 loop_path에 렌더링 (ffmpeg 백엔드)"""
+    cycle, offset = beat_plan(wav, sample_rate, beat_bpm)
+    with tracer.span('video_load', backend='ffmpeg', beat_sync=True):
+        loop_cache.render_beat_loop(ANIMATION_PATH, loop_path, cycle, offset)
+    return loop_path
+
+def render_track(wav, sample_rate, base_filename, video_backend=None, audio_format=None, beat_bpm=None):
+    """
+    라우드니스 정규화한 오디오로 비디오를 만들어 비디오 경로(실패 시 None)를 반환하는 함수
+    wav는 [채널, 샘플] numpy 배열이며, 모델에 의존하지 않아 별도 프로세스에서 실행 가능
+    - ffmpeg 백엔드: 정규화된 PCM을 파이프로 AAC 인코더/먹서에 바로 전달 (WAV 임시 파일 없음)
+    - frames/moviepy 백엔드 또는 ffmpeg 실패 시: WAV를 저장한 뒤 frames(ffmpeg 실패 시) 또는 지정한 백엔드로 렌더링
+    audio_format('opus', 'mp3', 'flac')을 주면 '{base_filename}.{형식}' 오디오 파일도 함께 저장
+    (오디오 파일 인코딩이 실패해도 MP4는 그대로 만들고, 비디오 대체 경로로 넘어가지 않음)
+    beat_bpm을 주면 비트 정렬 루프를 사용 (ffmpeg/frames 백엔드만 지원, moviepy는 고정 길이 루프)
+    """
+    audio_path = os.path.join(os.getcwd(), f"{base_filename}.wav")
+    video_path = os.path.join(os.getcwd(), f"{base_filename}_with_video.mp4")
+    backend = video_backend or VIDEO_BACKEND
+    audio_format = audio_format or AUDIO_DELIVERABLE
+    deliverable_path = os.path.join(os.getcwd(), f"{base_filename}.{audio_format}") if audio_format else None
+    
+    # 라우드니스 측정 (청크 단위 한 번의 패스, 원본 배열은 복사하지 않음)
+    with tracer.span('loudness_normalize', samples=wav.shape[-1]) as span:
+        loudness, rms = measure_loudness(wav, sample_rate)
+        gain = loudness_gain(loudness, rms)
+        span['loudness'] = loudness
+    
+    if not os.path.exists(ANIMATION_PATH):
+        print(f"애니메이션 파일을 찾을 수 없습니다: {ANIMATION_PATH}")
+        return None
+    
+    if backend == 'ffmpeg':
+        # 비트 정렬 루프는 트랙마다 달라서 결과물 옆에 만들고 먹싱 후 삭제
+        beat_loop_path = os.path.join(os.getcwd(), f"{base_filename}_beat_loop.mp4") if beat_bpm else None
+        try:
+            if beat_bpm:
+                loop_path = beat_aligned_loop(wav, sample_rate, beat_bpm, beat_loop_path)
+            else:
+                with tracer.span('video_load', backend='ffmpeg'):
+                    loop_path = loop_cache.get_loop(ANIMATION_PATH, fps=24)
+            # 게인/압축을 청크마다 적용하면서 ffmpeg 표준 입력으로 전달
+            with tracer.span('mux', backend='ffmpeg', source='pcm_pipe') as span:
+                try:
+                    mux_looped_pcm(loop_path, wav, sample_rate, video_path, gain, compressor=True,
+                                   audio_path=deliverable_path, audio_format=audio_format)
+                except Exception as e:
+                    if deliverable_path is None:
+                        raise
+                    # 오디오 파일 인코더(예: libopus가 없는 ffmpeg)만 실패했을 수 있으므로 MP4만 다시 인코딩
+                    print(f"오디오 파일 저장 실패 ({audio_format}), MP4만 다시 인코딩합니다: {str(e)}")
+                    if os.path.exists(deliverable_path):
+                        os.remove(deliverable_path)
+                    mux_looped_pcm(loop_path, wav, sample_rate, video_path, gain, compressor=True)
+                span['bytes'] = os.path.getsize(video_path)
+            return video_path
+        except Exception as e:
+            print(f"ffmpeg 파이프 인코딩 실패, WAV를 거쳐 프레임 맵으로 렌더링합니다: {str(e)}")
+            backend = 'frames'
+        finally:
+            if beat_loop_path is not None and os.path.exists(beat_loop_path):
+                os.remove(beat_loop_path)
+    
+    # 게인/압축을 청크마다 적용하면서 바로 WAV로 기록
+    with tracer.span('wav_write') as span:
+        write_wav(wav, sample_rate, audio_path, gain, compressor=True)
+        span['bytes'] = os.path.getsize(audio_path)
+    
+    if deliverable_path is not None:
+        try:
+            with tracer.span('audio_encode', format=audio_format) as span:
+                encode_audio(wav, sample_rate, deliverable_path, audio_format, gain, compressor=True)
+                span['bytes'] = os.path.getsize(deliverable_path)
+        except Exception as e:
+            print(f"오디오 파일 저장 실패 ({audio_format}): {str(e)}")
+    
+    # 비디오 생성 (frames 백엔드는 비트 정렬을 프레임 번호 맵에 반영)
+    beat = None
+    if beat_bpm and backend == 'frames':
+        try:
+            beat = beat_plan(wav, sample_rate, beat_bpm)
+        except Exception as e:
+            print(f"비트 추적 실패, 고정 길이 루프로 렌더링합니다: {str(e)}")
+    success = create_video_with_audio(audio_path, video_path, backend, beat)
+    
+    if success and os.path.exists(video_path):
+        return video_path
+    print("비디오 생성 실패")
+    return None
+
+# 루프 영상 캐시 (정방향 + 역방향 한 세트를 한 번만 인코딩해서 재사용)
+loop_cache = LoopAssetCache()
+
+def render_track_traced(*args, **kwargs):
+    """
+    render_track을 실행하고 (비디오 경로, 기록된 스팬 리스트)를 반환하는 함수
+    렌더링 프로세스 풀에서 기록한 스팬을 부모 프로세스의 트레이서로 전달할 때 사용
+    """
+    with tracer.collect() as spans:
+        video_path = render_track(*args, **kwargs)
+    return video_path, spans
+
+def render_video_with_moviepy(audio_path, output_path, animation_path):
+    """MoviePy로 애니메이션을 프레임 단위로 렌더링해 오디오와 합치는 함수"""
+    with tracer.span('video_load', backend='moviepy'):
         # 오디오 파일 로드
         audio = AudioFileClip(audio_path)
         duration = audio.duration
         
-        # YouTube 스타일 애니메이션 로드
-        animation_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "youtube_gif_new.mp4")
-        print(f"애니메이션 파일 경로: {animation_path}")
-        
-        if not os.path.exists(animation_path):
-            print(f"애니메이션 파일을 찾을 수 없습니다: {animation_path}")
-            return False
-            
         animation = VideoFileClip(animation_path)
-        
-        # 정방향 + 역방향 한 세트 만들기
-        reversed_animation = create_reversed_clip(animation.copy())
-        one_set = concatenate_videoclips([animation, reversed_animation])
-        
-        # 전체 오디오 길이에 맞게 반복
-        num_loops = int(np.ceil(duration / one_set.duration))
-        final_animation = concatenate_videoclips([one_set] * num_loops)
-        
-        # 오디오 길이에 맞게 자르기
-        final_animation = final_animation.subclip(0, duration)
-        
-        # 오디오 추가
-        final_video = final_animation.set_audio(audio)
-        
-        print(f"비디오 저장 시작: {output_path}")
-        
-        # 비디오 저장
+    
+    # 정방향 + 역방향 한 세트 만들기
+    reversed_animation = create_reversed_clip(animation.copy())
+    one_set = concatenate_videoclips([animation, reversed_animation])
+    
+    # 전체 오디오 길이에 맞게 반복
+    num_loops = int(np.ceil(duration / one_set.duration))
+    final_animation = concatenate_videoclips([one_set] * num_loops)
+    
+    # 오디오 길이에 맞게 자르기
+    final_animation = final_animation.subclip(0, duration)
+    
+    # 오디오 추가
+    final_video = final_animation.set_audio(audio)
+    
+    # 비디오 저장 (인코딩 + 먹싱)
+    with tracer.span('encode', backend='moviepy') as span:
         final_video.write_videofile(
             output_path,
             fps=24,
@@ -370,18 +759,73 @@ def create_video_with_audio(audio_path, output_path):
             preset='ultrafast',
             threads=4
         )
+        span['bytes'] = os.path.getsize(output_path)
+    
+    # 리소스 정리
+    audio.close()
+    animation.close()
+    reversed_animation.close()
+    one_set.close()
+    final_animation.close()
+    final_video.close()
+
+def render_video_with_frame_map(audio_path, output_path, animation_path, beat=None):
+    """
+    캐시된 원본 프레임 배열과 정방향/역방향 반복 프레임 번호 맵으로 비디오를 만들어 오디오와 합치는 함수
+    원본은 한 번만 디코딩되고, 출력 프레임은 탐색 없이 순서대로 인코더 파이프에 전달되므로 비용이 길이에 비례
+    beat=(한 세트 길이, 시작 오프셋)을 주면 비트 정렬 루프
+    """
+    with tracer.span('video_load', backend='frames') as span:
+        frames = loop_cache.get_frames(animation_path, fps=LOOP_FPS)
+        span['bytes'] = frames.nbytes
+    cycle, offset = beat or (None, 0.0)
+    output_frames = int(np.ceil(media_duration(audio_path) * LOOP_FPS))
+    index_map = pingpong_index_map(len(frames), output_frames, LOOP_FPS, cycle, offset)
+    with tracer.span('encode', backend='frames', frames=output_frames) as span:
+        stream_frame_map(frames, index_map, audio_path, output_path, LOOP_FPS)
+        span['bytes'] = os.path.getsize(output_path)
+
+def render_video(audio_path, output_path, backend=None, animation_path=ANIMATION_PATH, beat=None):
+    """선택한 백엔드로 애니메이션 루프와 오디오를 합쳐 output_path에 저장하는 함수"""
+    backend = backend or VIDEO_BACKEND
+    if backend == 'ffmpeg':
+        # 캐시된 루프 영상을 스트림 복사로 반복하고 오디오만 인코딩
+        with tracer.span('video_load', backend='ffmpeg'):
+            loop_path = loop_cache.get_loop(animation_path, fps=24)
+        with tracer.span('mux', backend='ffmpeg') as span:
+            mux_looped_video(loop_path, audio_path, output_path)
+            span['bytes'] = os.path.getsize(output_path)
+    elif backend == 'frames':
+        render_video_with_frame_map(audio_path, output_path, animation_path, beat)
+    elif backend == 'moviepy':
+        render_video_with_moviepy(audio_path, output_path, animation_path)
+    else:
+        raise ValueError(f"지원하지 않는 비디오 백엔드입니다: {backend} (지원: {', '.join(VIDEO_BACKENDS)})")
+
+def create_video_with_audio(audio_path, output_path, backend=None, beat=None):
+    try:
+        # YouTube 스타일 애니메이션 로드
+        print(f"애니메이션 파일 경로: {ANIMATION_PATH}")
+        
+        if not os.path.exists(ANIMATION_PATH):
+            print(f"애니메이션 파일을 찾을 수 없습니다: {ANIMATION_PATH}")
+            return False
         
-        # 리소스 정리
-        audio.close()
-        animation.close()
-        reversed_animation.close()
-        one_set.close()
-        final_animation.close()
-        final_video.close()
+        print(f"비디오 저장 시작: {output_path}")
+        
+        backend = backend or VIDEO_BACKEND
+        try:
+            render_video(audio_path, output_path, backend, beat=beat)
+        except Exception as e:
+            if backend == 'moviepy':
+                raise
+            print(f"{backend} 백엔드 실패, MoviePy로 렌더링합니다: {str(e)}")
+            render_video_with_moviepy(audio_path, output_path, ANIMATION_PATH)
         
         # 원본 wav 파일 삭제
-        if os.path.exists(audio_path):
-            os.remove(audio_path)
+        with tracer.span('cleanup'):
+            if os.path.exists(audio_path):
+                os.remove(audio_path)
             
         return True
         
@@ -404,10 +848,12 @@ if __name__ == "__main__":
             "nostalgic 80s japanese production style, ",
         )
         
-        generator.generate_track(
-            prompt=city_pop_prompts[1],
-            genre_settings=lofi_settings  # 또는 다른 장르 설정
+        # 여러 트랙을 한 번에 만들 때는 batch_render.py 사용
+        video_path = generator.generate_track(
+            city_pop_prompts[1],
+            lofi_settings  # 또는 다른 장르 설정
         )
+        print(f"생성 결과: {video_path}")
         
     except Exception as e:
         print(f"프로그램 실행 중 오류 발생: {str(e)}")
\ No newline at end of file
@@ -0,0 +1,61 @@
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+
+
+def _current_rss():
+    """현재 프로세스의 RSS(바이트), /proc을 읽을 수 없으면 None"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+
+class _RssSampler:
+    """측정 구간 동안 RSS를 주기적으로 읽어 최대값을 기록"""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak = _current_rss() or 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, _current_rss() or 0)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, _current_rss() or 0)
+
+
+@contextmanager
+def measure(stages, name):
+    """with 블록의 벽시계 시간, CPU 시간(자식 프로세스 포함), 최대 RSS를 stages[name]에 기록"""
+    record = {}
+    children_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu_before = time.process_time()
+    wall_before = time.perf_counter()
+    rss_before = _current_rss() or 0
+    with _RssSampler() as sampler:
+        yield record
+    wall = time.perf_counter() - wall_before
+    cpu = time.process_time() - cpu_before
+    children_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    children_cpu = (children_after.ru_utime - children_before.ru_utime) + \
+                   (children_after.ru_stime - children_before.ru_stime)
+    record.update({
+        'wall_s': round(wall, 4),
+        'cpu_s': round(cpu + children_cpu, 4),
+        'peak_rss_mb': round(sampler.peak / 1024 ** 2, 1),
+        'peak_rss_delta_mb': round(max(0, sampler.peak - rss_before) / 1024 ** 2, 1),
+    })
+    stages[name] = record
@@ -0,0 +1,196 @@
+import argparse
+import base64
+import io
+import json
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import requests
+import torch
+
+from device_profile import seeded
+
+# 모델 서버 기본 주소
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+
+def encode_array(array):
+    """numpy 배열을 .npy 바이트로 직렬화하는 함수"""
+    buffer = io.BytesIO()
+    np.save(buffer, np.ascontiguousarray(array), allow_pickle=False)
+    return buffer.getvalue()
+
+
+def decode_array(data):
+    """.npy 바이트를 numpy 배열로 역직렬화하는 함수"""
+    return np.load(io.BytesIO(data), allow_pickle=False)
+
+
+class ModelServer(ThreadingHTTPServer):
+    """
+    MusicGen 모델을 한 번만 로드해 여러 프론트엔드(웹/CLI)에 제공하는 HTTP 서버
+    - GET  /info                   : {'name', 'sample_rate', 'device'} (헬스 체크에도 사용, name에는 정밀도/양자화 접미사 포함)
+    - POST /generate               : {'descriptions', 'params', 'seed'} -> [배치, 채널, 샘플] float32 .npy
+    - POST /generate_continuation  : 위 요청 + 'prompt'(base64 .npy), 'prompt_sample_rate'
+    모델은 생성 파라미터를 상태로 가지므로 요청은 잠금으로 직렬화됨
+    seed가 있으면 잠금 안에서 그 요청만 해당 시드로 생성 (서버의 전역 RNG 상태는 복원)
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, model, model_tag=''):
+        super().__init__(address, _ModelRequestHandler)
+        self.model = model
+        self.model_tag = model_tag  # 생성 결과를 바꾸는 설정 (프론트엔드의 결과 캐시 키 구분용)
+        self.model_lock = threading.Lock()
+
+
+class _ModelRequestHandler(BaseHTTPRequestHandler):
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status, payload):
+        self._send(status, json.dumps(payload).encode('utf-8'), 'application/json')
+
+    def do_GET(self):
+        if self.path != '/info':
+            self._send_json(404, {'error': f"알 수 없는 경로: {self.path}"})
+            return
+        model = self.server.model
+        self._send_json(200, {
+            'name': getattr(model, 'name', type(model).__name__) + self.server.model_tag,
+            'sample_rate': model.sample_rate,
+            'device': str(getattr(model, 'device', 'cpu')),
+        })
+
+    def do_POST(self):
+        if self.path not in ('/generate', '/generate_continuation'):
+            self._send_json(404, {'error': f"알 수 없는 경로: {self.path}"})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            model = self.server.model
+            with self.server.model_lock, seeded(request.get('seed'), getattr(model, 'device', 'cpu')):
+                model.set_generation_params(**request['params'])
+                if self.path == '/generate':
+                    wav = model.generate(request['descriptions'])
+                else:
+                    prompt = torch.from_numpy(decode_array(base64.b64decode(request['prompt'])))
+                    wav = model.generate_continuation(
+                        prompt.to(getattr(model, 'device', 'cpu')),
+                        prompt_sample_rate=request['prompt_sample_rate'],
+                        descriptions=request['descriptions']
+                    )
+            self._send(200, encode_array(wav.float().cpu().numpy()), 'application/octet-stream')
+        except Exception as e:
+            print(f"모델 서버 요청 처리 중 오류 발생: {str(e)}")
+            self._send_json(500, {'error': str(e)})
+
+    def log_message(self, format, *args):
+        pass
+
+
+class RemoteMusicGen:
+    """
+    ModelServer에 생성을 위임하는 가벼운 MusicGen 클라이언트
+    LocalEDMGenerator(model=RemoteMusicGen(url))로 사용하면 프론트엔드는 가중치를 로드하지 않음
+    """
+
+    def __init__(self, url, timeout=600):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        self.device = 'cpu'
+        self.params = {}
+        self.seed = None
+        info = requests.get(f"{self.url}/info", timeout=10)
+        info.raise_for_status()
+        info = info.json()
+        self.name = f"remote:{info['name']}"
+        self.sample_rate = info['sample_rate']
+
+    def set_generation_params(self, **params):
+        self.params = dict(params)
+
+    @contextmanager
+    def seeded(self, seed):
+        """with 블록 안의 생성 요청에 seed를 담아 보냄 (서버에서 적용)"""
+        self.seed = seed
+        try:
+            yield
+        finally:
+            self.seed = None
+
+    def _post(self, path, payload):
+        response = requests.post(f"{self.url}{path}", json=payload, timeout=self.timeout)
+        if response.status_code != 200:
+            raise RuntimeError(f"모델 서버 오류 ({response.status_code}): {response.text}")
+        return torch.from_numpy(decode_array(response.content))
+
+    def generate(self, descriptions, progress=False, params=None, seed=None):
+        """params/seed를 주면 set_generation_params/seeded로 지정한 값 대신 사용 (여러 스레드가 공유할 때)"""
+        params = self.params if params is None else params
+        return self._post('/generate', {
+            'descriptions': list(descriptions),
+            'params': params,
+            'seed': self.seed if seed is None else seed,
+        })
+
+    def generate_continuation(self, prompt, prompt_sample_rate, descriptions=None, progress=False, params=None,
+                              seed=None):
+        if prompt.dim() == 2:
+            prompt = prompt[None]
+        if descriptions is None:
+            descriptions = [None] * len(prompt)
+        return self._post('/generate_continuation', {
+            'descriptions': list(descriptions),
+            'params': self.params if params is None else params,
+            'seed': self.seed if seed is None else seed,
+            'prompt': base64.b64encode(encode_array(prompt.float().cpu().numpy())).decode('ascii'),
+            'prompt_sample_rate': prompt_sample_rate,
+        })
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MusicGen 모델 서버")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--stub', action='store_true', help="가중치 없이 스텁 모델로 실행 (테스트용)")
+    parser.add_argument('--device', help="모델을 올릴 디바이스 (예: cuda:1, cpu), 생략하면 자동 선택")
+    parser.add_argument('--threads', type=int, help="CPU 연산 스레드 수 (torch.set_num_threads)")
+    parser.add_argument('--model-size', choices=['small', 'medium', 'melody'], help="모델 크기 (생략하면 MUSICGEN_MODEL_SIZE)")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    if args.stub:
+        from stub_model import StubMusicGen
+        model = StubMusicGen()
+        model_tag = ''
+    else:
+        from main import LocalEDMGenerator
+        from settings import genre_prompts
+        generator = LocalEDMGenerator(device=args.device, model_size=args.model_size)
+        generator.warm_conditioning([prompt for prompts in genre_prompts.values() for prompt in prompts])
+        model = generator.model
+        model_tag = generator.model_tag
+
+    server = ModelServer((args.host, args.port), model, model_tag)
+    print(f"모델 서버 시작: http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
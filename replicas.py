@@ -0,0 +1,274 @@
+import argparse
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import requests
+
+from model_server import DEFAULT_HOST, RemoteMusicGen
+
+# 복제본 풀 기본값
+BASE_PORT = 8800            # 복제본 i는 BASE_PORT + i 포트에서 실행
+HEALTH_INTERVAL = 5.0       # 헬스 체크 주기(초)
+HEALTH_TIMEOUT = 2.0        # 헬스 체크 요청 제한 시간(초)
+STARTUP_TIMEOUT = 600       # 모든 복제본이 준비되기를 기다리는 최대 시간(초)
+
+MODEL_SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model_server.py")
+
+
+def available_devices():
+    """복제본을 올릴 수 있는 디바이스 목록 (GPU가 없으면 ['cpu'])"""
+    import torch
+    if torch.cuda.is_available():
+        return [f"cuda:{i}" for i in range(torch.cuda.device_count())]
+    return ['cpu']
+
+
+class Replica:
+    """모델 서버 프로세스 하나와 그 상태 (처리 중인 요청 수, 헬스 체크 결과)"""
+
+    def __init__(self, url, process=None, device='cpu', threads=None):
+        self.url = url.rstrip('/')
+        self.process = process
+        self.device = device
+        self.threads = threads
+        self.client = None  # 첫 헬스 체크 성공 시 RemoteMusicGen 생성
+        self.in_flight = 0
+        self.healthy = False
+        self.completed = 0
+        self.last_error = None
+
+    def check(self, timeout=HEALTH_TIMEOUT):
+        """/info 요청으로 상태를 확인하고 healthy 여부 반환"""
+        if self.process is not None and self.process.poll() is not None:
+            self.healthy = False
+            self.last_error = f"프로세스 종료됨 (코드 {self.process.returncode})"
+            return False
+        try:
+            response = requests.get(f"{self.url}/info", timeout=timeout)
+            response.raise_for_status()
+            if self.client is None:
+                self.client = RemoteMusicGen(self.url)
+            self.healthy = True
+            self.last_error = None
+        except Exception as e:
+            self.healthy = False
+            self.last_error = str(e)
+        return self.healthy
+
+    def to_dict(self):
+        return {
+            'url': self.url,
+            'device': self.device,
+            'threads': self.threads,
+            'healthy': self.healthy,
+            'in_flight': self.in_flight,
+            'completed': self.completed,
+            'last_error': self.last_error,
+        }
+
+
+class ReplicaPool:
+    """
+    여러 모델 서버 복제본에 생성 요청을 나눠 보내는 풀
+    - 라우팅: 정상 복제본 중 처리 중인 요청이 가장 적은 복제본 선택
+    - 헬스 체크: 백그라운드 스레드가 주기적으로 /info 확인, 연결 오류가 난 복제본은 즉시 제외
+    - 정상 복제본이 하나도 없으면 다시 살아날 때까지 대기
+    """
+
+    def __init__(self, replicas, health_interval=HEALTH_INTERVAL):
+        self.replicas = list(replicas)
+        self.health_interval = health_interval
+        self._condition = threading.Condition()
+        self._stop = threading.Event()
+        self._health_thread = threading.Thread(target=self._health_loop, name="replica-health", daemon=True)
+        self._health_thread.start()
+
+    def check_health(self):
+        for replica in self.replicas:
+            replica.check()
+        with self._condition:
+            self._condition.notify_all()
+
+    def _health_loop(self):
+        while not self._stop.is_set():
+            self.check_health()
+            self._stop.wait(self.health_interval)
+
+    def wait_ready(self, timeout=STARTUP_TIMEOUT, minimum=None):
+        """정상 복제본이 minimum개(생략하면 전부)가 될 때까지 대기, 시간 초과 시 RuntimeError"""
+        minimum = len(self.replicas) if minimum is None else minimum
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while sum(replica.healthy for replica in self.replicas) < minimum:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    errors = [f"{r.url}: {r.last_error}" for r in self.replicas if not r.healthy]
+                    raise RuntimeError(f"복제본이 준비되지 않았습니다: {'; '.join(errors)}")
+                self._condition.wait(timeout=min(remaining, 1.0))
+
+    @property
+    def healthy_count(self):
+        return sum(replica.healthy for replica in self.replicas)
+
+    @contextmanager
+    def acquire(self):
+        """처리 중인 요청이 가장 적은 정상 복제본을 골라 with 블록 동안 점유"""
+        with self._condition:
+            while True:
+                candidates = [replica for replica in self.replicas if replica.healthy]
+                if candidates:
+                    break
+                if self._stop.is_set():
+                    raise RuntimeError("복제본 풀이 종료되었습니다")
+                self._condition.wait(timeout=self.health_interval)
+            replica = min(candidates, key=lambda r: (r.in_flight, r.completed))
+            replica.in_flight += 1
+        succeeded = False
+        try:
+            yield replica
+            succeeded = True
+        except requests.RequestException as e:
+            # 연결 오류는 복제본 문제로 보고 다음 헬스 체크까지 라우팅에서 제외
+            print(f"복제본 오류, 라우팅에서 제외합니다 ({replica.url}): {str(e)}")
+            replica.healthy = False
+            replica.last_error = str(e)
+            raise
+        finally:
+            with self._condition:
+                replica.in_flight -= 1
+                replica.completed += succeeded
+                self._condition.notify_all()
+
+    def status(self):
+        with self._condition:
+            return [replica.to_dict() for replica in self.replicas]
+
+    def stop(self):
+        """헬스 체크를 멈추고 풀이 띄운 모델 서버 프로세스 종료"""
+        self._stop.set()
+        with self._condition:
+            self._condition.notify_all()
+        for replica in self.replicas:
+            if replica.process is not None and replica.process.poll() is None:
+                replica.process.terminate()
+        for replica in self.replicas:
+            if replica.process is not None:
+                try:
+                    replica.process.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    replica.process.kill()
+
+
+def launch_replicas(count, stub=False, devices=None, threads=None, host=DEFAULT_HOST, base_port=BASE_PORT,
+                    health_interval=HEALTH_INTERVAL):
+    """
+    model_server.py 프로세스 count개를 띄우고 ReplicaPool 반환 (준비 대기는 wait_ready로)
+    - devices: 복제본에 차례로 배정할 디바이스 목록 (생략하면 사용 가능한 GPU 전체, 없으면 CPU)
+    - threads: 복제본별 CPU 스레드 수 (생략하면 CPU 복제본끼리 코어를 나눠 가짐)
+    """
+    if devices is None:
+        devices = ['cpu'] if stub else available_devices()
+    cpu_replicas = sum(1 for i in range(count) if devices[i % len(devices)] == 'cpu')
+    replicas = []
+    for i in range(count):
+        device = devices[i % len(devices)]
+        replica_threads = threads
+        if replica_threads is None and device == 'cpu':
+            replica_threads = max(1, (os.cpu_count() or 1) // max(1, cpu_replicas))
+        port = base_port + i
+        command = [sys.executable, MODEL_SERVER_SCRIPT, '--host', host, '--port', str(port)]
+        if stub:
+            command.append('--stub')
+        else:
+            command += ['--device', device]
+        env = dict(os.environ)
+        if replica_threads:
+            command += ['--threads', str(replica_threads)]
+            env['OMP_NUM_THREADS'] = env['MKL_NUM_THREADS'] = str(replica_threads)
+        print(f"복제본 {i} 시작: {device}, 포트 {port}" + (f", 스레드 {replica_threads}" if replica_threads else ""))
+        process = subprocess.Popen(command, env=env)
+        replicas.append(Replica(f"http://{host}:{port}", process, device, replica_threads))
+    return ReplicaPool(replicas, health_interval)
+
+
+class PooledMusicGen:
+    """
+    ReplicaPool에 생성을 위임하는 MusicGen 대체 모델
+    생성 파라미터와 시드를 스레드별로 보관하므로 여러 배치 워커 스레드가 하나의 인스턴스를 공유할 수 있음
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.device = 'cpu'
+        self._local = threading.local()
+        with pool.acquire() as replica:
+            client = replica.client
+        self.name = f"pool:{client.name.split(':', 1)[-1]}"
+        self.sample_rate = client.sample_rate
+
+    def set_generation_params(self, **params):
+        self._local.params = dict(params)
+
+    @property
+    def _params(self):
+        return getattr(self._local, 'params', {})
+
+    @contextmanager
+    def seeded(self, seed):
+        """with 블록 안에서 이 스레드가 보내는 생성 요청에 seed를 담음 (복제본 서버에서 적용)"""
+        self._local.seed = seed
+        try:
+            yield
+        finally:
+            self._local.seed = None
+
+    def generate(self, descriptions, progress=False):
+        with self.pool.acquire() as replica:
+            return replica.client.generate(descriptions, params=self._params, seed=getattr(self._local, 'seed', None))
+
+    def generate_continuation(self, prompt, prompt_sample_rate, descriptions=None, progress=False):
+        with self.pool.acquire() as replica:
+            return replica.client.generate_continuation(
+                prompt, prompt_sample_rate, descriptions=descriptions, params=self._params,
+                seed=getattr(self._local, 'seed', None)
+            )
+
+
+def main():
+    """스텁/실제 복제본을 띄워 동시 요청을 보내고 복제본별 처리 분포와 처리량을 출력"""
+    parser = argparse.ArgumentParser(description="모델 복제본 풀 실행/점검")
+    parser.add_argument('--replicas', type=int, default=2)
+    parser.add_argument('--stub', action='store_true', help="가중치 없이 스텁 모델 복제본 실행")
+    parser.add_argument('--threads', type=int, help="복제본별 CPU 스레드 수")
+    parser.add_argument('--base-port', type=int, default=BASE_PORT)
+    parser.add_argument('--requests', type=int, default=8, help="동시에 보낼 요청 수")
+    parser.add_argument('--duration', type=int, default=5)
+    args = parser.parse_args()
+
+    pool = launch_replicas(args.replicas, stub=args.stub, threads=args.threads, base_port=args.base_port)
+    try:
+        pool.wait_ready()
+        model = PooledMusicGen(pool)
+
+        def run(i):
+            model.set_generation_params(duration=args.duration)
+            return model.generate([f"pool check {i}"]).shape
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.requests) as executor:
+            shapes = list(executor.map(run, range(args.requests)))
+        elapsed = time.perf_counter() - start
+        print(f"{len(shapes)}개 요청 완료: {elapsed:.2f}초")
+        for replica in pool.status():
+            print(f"  {replica['url']} ({replica['device']}): {replica['completed']}건 처리")
+    finally:
+        pool.stop()
+
+
+if __name__ == "__main__":
+    main()
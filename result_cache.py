@@ -0,0 +1,140 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# 결과 캐시 저장 위치와 최대 용량
+RESULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".result_cache")
+RESULT_CACHE_MAX_BYTES = 2 * 1024 ** 3
+
+# 생성 결과에 영향을 주는 설정 키 (set_generation_params 값 + 롱폼 윈도우 설정)
+GENERATION_KEYS = ('duration', 'temperature', 'top_k', 'top_p', 'cfg_coef', 'window_duration', 'window_overlap')
+
+
+def normalize_prompt(prompt):
+    """공백 차이만 있는 프롬프트가 같은 키를 갖도록 정규화"""
+    return " ".join(prompt.split())
+
+
+def _digest(payload):
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """
+    동일한 생성 요청의 결과를 재사용하는 내용 주소 기반 디스크 캐시
+    - 오디오 키: (정규화된 프롬프트, 생성 파라미터, 시드, 모델 ID) -> 디코딩된 오디오 (.npy)
+    - 비디오 키: (오디오 키, 비디오 템플릿 해시, 비디오 백엔드) -> 최종 MP4 (.mp4)
+    비디오 템플릿만 바뀌면 오디오 캐시로 디코딩을 건너뛰고 렌더링만 다시 함
+    전체 크기가 max_bytes를 넘으면 가장 오래 사용하지 않은 항목부터 삭제 (LRU)
+    시드가 없는 요청은 결과가 매번 달라서 캐시하지 않음
+    """
+
+    def __init__(self, cache_dir=RESULT_CACHE_DIR, max_bytes=RESULT_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+        # 파일 이름 -> 크기 (마지막 사용 시각 순서), 시작 시 한 번만 디렉토리를 읽음
+        entries = []
+        for name in os.listdir(cache_dir):
+            path = os.path.join(cache_dir, name)
+            if name.endswith(('.npy', '.mp4')) and os.path.isfile(path):
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, name, stat.st_size))
+        self._entries = OrderedDict((name, size) for _, name, size in sorted(entries))
+        self._total_bytes = sum(self._entries.values())
+
+    @staticmethod
+    def cacheable(settings):
+        return settings.get('seed') is not None
+
+    @staticmethod
+    def generation_key(prompt, settings, model_id, defaults=None):
+        """오디오 캐시 키 (defaults는 settings에 없을 때 쓰는 기본값, 예: 롱폼 윈도우 길이)"""
+        defaults = defaults or {}
+        payload = {
+            'prompt': normalize_prompt(prompt),
+            'params': {key: settings.get(key, defaults.get(key)) for key in GENERATION_KEYS},
+            'seed': settings.get('seed'),
+            'model': model_id,
+        }
+        # 멜로디 조건 생성은 레퍼런스 오디오 내용으로 구분 (업로드마다 경로가 달라도 같은 키)
+        if settings.get('reference_audio'):
+            from chroma_store import audio_hash
+            payload['melody'] = audio_hash(settings['reference_audio'])
+        return _digest(payload)
+
+    @staticmethod
+    def video_key(generation_key, template_hash, video_backend, beat_sync=False, bpm=None):
+        """비디오 캐시 키 (비트 정렬 비디오는 사전 템포 bpm별로 따로 저장)"""
+        payload = {'audio': generation_key, 'template': template_hash, 'backend': video_backend}
+        if beat_sync:
+            payload['beat_sync'] = True
+            payload['bpm'] = bpm
+        return _digest(payload)
+
+    def _path(self, name):
+        return os.path.join(self.cache_dir, name)
+
+    def get(self, key, ext):
+        """캐시 파일 경로 반환 (없으면 None), 사용 시각 갱신"""
+        name = f"{key}{ext}"
+        with self._lock:
+            if name not in self._entries:
+                return None
+            path = self._path(name)
+            if not os.path.exists(path):
+                self._total_bytes -= self._entries.pop(name)
+                return None
+            self._entries.move_to_end(name)
+        os.utime(path)
+        return path
+
+    def put_file(self, key, ext, source_path):
+        """파일을 캐시에 복사 (같은 파일 시스템이면 하드 링크) 후 캐시 경로 반환"""
+        fd, tmp_path = tempfile.mkstemp(suffix=ext, dir=self.cache_dir)
+        os.close(fd)
+        os.remove(tmp_path)
+        try:
+            os.link(source_path, tmp_path)
+        except OSError:
+            shutil.copyfile(source_path, tmp_path)
+        return self._commit(f"{key}{ext}", tmp_path)
+
+    def get_audio(self, key):
+        """캐시된 오디오 [채널, 샘플] 배열 반환 (없으면 None)"""
+        path = self.get(key, '.npy')
+        return np.load(path) if path else None
+
+    def put_audio(self, key, wav):
+        """오디오 [채널, 샘플] 배열을 캐시에 저장"""
+        fd, tmp_path = tempfile.mkstemp(suffix='.npy', dir=self.cache_dir)
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, np.ascontiguousarray(wav, dtype=np.float32))
+        return self._commit(f"{key}.npy", tmp_path)
+
+    def _commit(self, name, tmp_path):
+        path = self._path(name)
+        size = os.path.getsize(tmp_path)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._total_bytes += size - self._entries.pop(name, 0)
+            self._entries[name] = size
+            self._evict()
+        return path
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            name, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.remove(self._path(name))
+            except OSError:
+                pass
@@ -0,0 +1,44 @@
+from capacity import DEFAULT_FRAME_RATE
+
+# 스케줄러 기본값
+LATENCY_BUDGET_SECONDS = 600   # 요청 하나가 기다리고 생성되는 데 허용하는 최대 예상 시간
+AGING_RATE = 0.5               # 대기 1초마다 우선순위 비용을 줄이는 양 (긴 작업의 기아 방지)
+ADMISSION_MODE = 'reject'      # 한도를 넘는 요청 처리: 'reject'(거절) 또는 'defer'(다른 요청 뒤로 미룸)
+DEFER_PENALTY = 1e9            # 미뤄진 요청의 우선순위 비용 가산값
+
+ACCEPT = 'accept'
+DEFER = 'defer'
+REJECT = 'reject'
+
+
+class CostScheduler:
+    """
+    예상 디코딩 비용 기반 스케줄러
+    - 비용: duration, 배치 크기, 기록된 디코딩 속도(CapacityModel)로 예측한 디코딩 시간
+    - 순서: 예상 비용이 짧은 작업 우선 (기다린 시간만큼 비용을 깎아주는 aging 적용)
+    - 승인: 예상 대기 + 자기 비용이 latency_budget을 넘으면 거절하거나 뒤로 미룸
+    """
+
+    def __init__(self, capacity, frame_rate=DEFAULT_FRAME_RATE, latency_budget=LATENCY_BUDGET_SECONDS,
+                 aging_rate=AGING_RATE, admission_mode=ADMISSION_MODE):
+        if admission_mode not in (REJECT, DEFER):
+            raise ValueError(f"지원하지 않는 승인 방식입니다: {admission_mode}")
+        self.capacity = capacity
+        self.frame_rate = frame_rate
+        self.latency_budget = latency_budget
+        self.aging_rate = aging_rate
+        self.admission_mode = admission_mode
+
+    def cost(self, settings, batch_size=1):
+        """settings의 트랙을 batch_size 배치로 디코딩하는 예상 시간(초)"""
+        return self.capacity.estimate_seconds(settings['duration'], batch_size, self.frame_rate)
+
+    def priority(self, cost, waited, deferred=False):
+        """작을수록 먼저 실행되는 우선순위 값"""
+        return cost - self.aging_rate * waited + (DEFER_PENALTY if deferred else 0.0)
+
+    def admit(self, cost, expected_wait):
+        """새 요청의 승인 결과 (ACCEPT, DEFER, REJECT)"""
+        if expected_wait + cost <= self.latency_budget:
+            return ACCEPT
+        return self.admission_mode
@@ -0,0 +1,40 @@
+import threading
+import time
+from contextlib import contextmanager
+
+
+class StartupTimer:
+    """시작 과정의 단계별 소요 시간을 기록하고 보고하는 타이머"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.phases = []  # [(단계 이름, 소요 시간(초)), ...]
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name):
+        """with 블록의 소요 시간을 name 단계로 기록"""
+        phase_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.phases.append((name, time.perf_counter() - phase_start))
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def report(self, title="시작 시간 보고서"):
+        """단계별 소요 시간 표를 문자열로 반환"""
+        with self._lock:
+            phases = list(self.phases)
+        width = max([len(name) for name, _ in phases] + [10])
+        lines = [f"=== {title} ==="]
+        for name, seconds in phases:
+            lines.append(f"  {name:<{width}}  {seconds:7.2f}s")
+        lines.append(f"  {'전체 경과':<{width}}  {self.elapsed():7.2f}s")
+        return "\n".join(lines)
+
+
+# 프로세스 전체에서 공유하는 타이머 (모듈을 처음 임포트한 시점부터 측정)
+startup_timer = StartupTimer()
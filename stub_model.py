@@ -0,0 +1,58 @@
+import hashlib
+
+import torch
+
+
+class StubMusicGen:
+    """
+    가중치 없이 CPU에서 동작하는 MusicGen 대체 모델 (테스트/벤치마크용)
+    MusicGen과 같은 인터페이스(sample_rate, set_generation_params, generate, generate_continuation)를 제공하며,
+    프롬프트와 생성 파라미터가 같으면 항상 같은 노이즈 오디오를 반환
+    """
+
+    def __init__(self, sample_rate=32000, audio_channels=1, name='stub'):
+        self.name = name
+        self.sample_rate = sample_rate
+        self.audio_channels = audio_channels
+        self.frame_rate = 50
+        self.device = 'cpu'
+        self.duration = 30
+        self.generation_params = {}
+        self._progress_callback = None
+
+    def set_generation_params(self, duration=30, **kwargs):
+        self.duration = duration
+        self.generation_params = dict(kwargs)
+
+    def set_custom_progress_callback(self, progress_callback=None):
+        self._progress_callback = progress_callback
+
+    def _report_progress(self, prompt_samples=0):
+        # audiocraft와 같이 프롬프트를 뺀 새로 생성한 스텝 수만 보고
+        if self._progress_callback is not None:
+            steps = int(self.duration * self.frame_rate) - int(prompt_samples / self.sample_rate * self.frame_rate)
+            self._progress_callback(steps, steps)
+
+    def _noise(self, description, num_samples):
+        key = f"{description}|{sorted(self.generation_params.items())}|{num_samples}"
+        seed = int.from_bytes(hashlib.sha256(key.encode()).digest()[:8], 'little')
+        generator = torch.Generator().manual_seed(seed)
+        return 0.1 * torch.randn(self.audio_channels, num_samples, generator=generator)
+
+    def generate(self, descriptions, progress=False):
+        num_samples = int(self.duration * self.sample_rate)
+        wav = torch.stack([self._noise(d, num_samples) for d in descriptions])
+        self._report_progress()
+        return wav
+
+    def generate_continuation(self, prompt, prompt_sample_rate, descriptions=None, progress=False):
+        if prompt.dim() == 2:
+            prompt = prompt[None]
+        if descriptions is None:
+            descriptions = [None] * len(prompt)
+        assert prompt_sample_rate == self.sample_rate, "스텁 모델은 리샘플링을 지원하지 않습니다"
+        num_samples = int(self.duration * self.sample_rate) - prompt.shape[-1]
+        assert num_samples > 0, "프롬프트가 생성 길이보다 깁니다"
+        continuation = torch.stack([self._noise(d, num_samples) for d in descriptions])
+        self._report_progress(prompt.shape[-1])
+        return torch.cat([prompt.cpu(), continuation], dim=-1)
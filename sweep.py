@@ -0,0 +1,203 @@
+import argparse
+import csv
+import itertools
+import json
+import os
+import random
+import time
+
+from settings import get_default_prompt, get_genre_settings
+
+# 탐색할 생성 파라미터와 랜덤 탐색 범위 (최소, 최대)
+SWEEP_PARAMS = ('temperature', 'top_k', 'top_p', 'cfg_coef')
+RANDOM_RANGES = {
+    'temperature': (0.2, 1.0),
+    'top_k': (10, 250),
+    'top_p': (0.5, 0.95),
+    'cfg_coef': (2.0, 7.0),
+}
+INTEGER_PARAMS = ('top_k',)
+
+# 스윕 기본값 (짧은 길이로 여러 조합을 빠르게 비교)
+SWEEP_DURATION = 10
+SAMPLES_PER_CONFIG = 2
+OUTPUT_DIR = os.path.join(os.getcwd(), "sweeps")
+
+# 비교표 열 (이름, 형식)
+TABLE_COLUMNS = [
+    ('config', '{}'), ('temperature', '{:.2f}'), ('top_k', '{}'), ('top_p', '{:.2f}'), ('cfg_coef', '{:.1f}'),
+    ('samples', '{}'), ('decode_s', '{:.1f}'), ('tokens_per_s', '{:.1f}'),
+    ('lufs', '{:.1f}'), ('bpm', '{:.1f}'), ('silence_ratio', '{:.3f}'),
+]
+
+
+def _cast(name, value):
+    return int(float(value)) if name in INTEGER_PARAMS else float(value)
+
+
+def parse_grid(specs):
+    """'temperature=0.3,0.6' 형식의 목록을 {파라미터: 값 리스트}로 변환"""
+    grid = {}
+    for spec in specs or []:
+        name, _, values = spec.partition('=')
+        if name not in SWEEP_PARAMS or not values:
+            raise ValueError(f"잘못된 스윕 파라미터입니다: {spec} (형식: 이름=값1,값2, 지원: {', '.join(SWEEP_PARAMS)})")
+        grid[name] = [_cast(name, value) for value in values.split(',')]
+    return grid
+
+
+def grid_configs(base, grid):
+    """지정한 파라미터 값의 모든 조합 (지정하지 않은 파라미터는 장르 기본값)"""
+    names = list(grid)
+    return [dict(base, **dict(zip(names, values))) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def random_configs(base, count, seed=None, ranges=RANDOM_RANGES):
+    """각 파라미터를 범위 안에서 균등하게 뽑은 count개의 조합"""
+    rng = random.Random(seed)
+    configs = []
+    for _ in range(count):
+        config = dict(base)
+        for name, (low, high) in ranges.items():
+            config[name] = rng.randint(low, high) if name in INTEGER_PARAMS else round(rng.uniform(low, high), 3)
+        configs.append(config)
+    return configs
+
+
+def audio_metrics(wav, sample_rate, expected_bpm=None):
+    """[채널, 샘플] 배열의 객관 지표: 라우드니스(LUFS), 추정 BPM, 무음 비율"""
+    from audio_post import estimate_tempo, measure_loudness, silence_ratio
+
+    lufs, _ = measure_loudness(wav, sample_rate)
+    bpm, _ = estimate_tempo(wav, sample_rate, start_bpm=expected_bpm or 120.0)
+    return {'lufs': round(lufs, 2), 'bpm': round(bpm, 1), 'silence_ratio': round(silence_ratio(wav), 4)}
+
+
+def run_config(generator, index, prompt, settings, samples, max_batch_size, audio_dir=None):
+    """
+    한 샘플링 설정으로 samples개의 트랙을 배치 generate 호출로 생성하고 측정 결과 반환
+    같은 설정의 샘플은 프롬프트를 복제해 한 번에 디코딩 (배치 크기를 넘으면 나눠서 호출)
+    """
+    import torch
+    from measurement import measure
+    from audio_post import loudness_gain, measure_loudness, write_wav
+
+    stages = {}
+    runs = []
+    sample_rate = generator.model.sample_rate
+    for start in range(0, samples, max_batch_size):
+        batch = min(max_batch_size, samples - start)
+        batch_settings = dict(settings)
+        if settings.get('seed') is not None:
+            batch_settings['seed'] = settings['seed'] + start
+        with measure(stages, f"batch_{start}"):
+            wav = torch.cat(list(generator._iter_decode([prompt] * batch, batch_settings)), dim=-1)
+        for i in range(batch):
+            sample = wav[i].float().numpy()
+            run = {'sample': start + i}
+            run.update(audio_metrics(sample, sample_rate, settings.get('bpm')))
+            if audio_dir is not None:
+                run['audio'] = os.path.join(audio_dir, f"config{index:03d}_sample{start + i:02d}.wav")
+                # 렌더링 결과와 같은 라우드니스 보정/컴프레서를 거쳐 저장 (청취 비교용)
+                lufs, rms = measure_loudness(sample, sample_rate)
+                write_wav(sample, sample_rate, run['audio'], loudness_gain(lufs, rms), compressor=True)
+            runs.append(run)
+
+    decode_s = sum(stage['wall_s'] for stage in stages.values())
+    tokens = settings['duration'] * generator.frame_rate * samples
+    row = {'config': index, 'samples': samples, 'decode_s': round(decode_s, 2),
+           'tokens_per_s': round(tokens / decode_s, 2) if decode_s > 0 else None}
+    row.update({name: settings[name] for name in SWEEP_PARAMS})
+    for metric in ('lufs', 'bpm', 'silence_ratio'):
+        row[metric] = round(sum(run[metric] for run in runs) / len(runs), 4)
+    return row, runs, stages
+
+
+def format_table(rows):
+    """비교표를 고정폭 텍스트 표로 변환"""
+    cells = [[name for name, _ in TABLE_COLUMNS]]
+    for row in rows:
+        cells.append([
+            fmt.format(row[name]) if row.get(name) is not None else '-' for name, fmt in TABLE_COLUMNS
+        ])
+    widths = [max(len(line[i]) for line in cells) for i in range(len(TABLE_COLUMNS))]
+    return "\n".join("  ".join(cell.rjust(width) for cell, width in zip(line, widths)) for line in cells)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="생성 파라미터(temperature, top_k, top_p, cfg_coef) 그리드/랜덤 탐색")
+    parser.add_argument('--genre', default='City Pop', help="기본 설정과 기본 프롬프트를 가져올 장르")
+    parser.add_argument('--prompt', help="생략하면 장르 기본 프롬프트")
+    parser.add_argument('--grid', nargs='+', metavar='PARAM=V1,V2', help="그리드 탐색 값 (예: temperature=0.3,0.6 top_k=50,150)")
+    parser.add_argument('--random', type=int, metavar='N', help="랜덤 탐색으로 N개 조합 생성")
+    parser.add_argument('--duration', type=int, default=SWEEP_DURATION)
+    parser.add_argument('--samples', type=int, default=SAMPLES_PER_CONFIG, help="조합마다 생성할 트랙 수 (한 번의 배치로 생성)")
+    parser.add_argument('--max-batch-size', type=int, help="한 번의 generate 호출에 묶을 최대 트랙 수")
+    parser.add_argument('--seed', type=int, default=0, help="조합마다 같은 시드로 시작 (-1이면 무작위)")
+    parser.add_argument('--output-dir', default=OUTPUT_DIR)
+    parser.add_argument('--save-audio', action='store_true', help="생성한 트랙을 WAV로 저장")
+    parser.add_argument('--stub', action='store_true', help="가중치 없이 스텁 모델로 실행 (파이프라인 확인용)")
+    args = parser.parse_args()
+
+    base = get_genre_settings(args.genre).copy()
+    base.update({'duration': args.duration, 'seed': args.seed if args.seed >= 0 else None})
+    prompt = args.prompt or get_default_prompt(args.genre)
+    if args.random:
+        configs = random_configs(base, args.random, seed=args.seed if args.seed >= 0 else None)
+    else:
+        configs = grid_configs(base, parse_grid(args.grid))
+    print(f"{len(configs)}개 조합 x {args.samples}개 샘플 ({args.duration}초)")
+
+    from main import LocalEDMGenerator
+    from batching import MAX_BATCH_SIZE
+    from capacity import CapacityModel
+    if args.stub:
+        from stub_model import StubMusicGen
+        generator = LocalEDMGenerator(model=StubMusicGen(), capacity=CapacityModel(path=None))
+    else:
+        generator = LocalEDMGenerator(capacity=CapacityModel(path=None))
+    max_batch_size = args.max_batch_size or MAX_BATCH_SIZE
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    audio_dir = None
+    if args.save_audio:
+        audio_dir = os.path.join(args.output_dir, "audio")
+        os.makedirs(audio_dir, exist_ok=True)
+
+    # 모든 조합이 같은 프롬프트를 쓰므로 텍스트 조건은 한 번만 인코딩하고 이후 조합은 캐시에서 재사용
+    generator.warm_conditioning([prompt])
+
+    started = time.time()
+    rows = []
+    details = []
+    for index, settings in enumerate(configs):
+        row, runs, stages = run_config(generator, index, prompt, settings, args.samples, max_batch_size, audio_dir)
+        rows.append(row)
+        details.append({'config': index, 'settings': settings, 'runs': runs, 'stages': stages})
+        print(f"[{index + 1}/{len(configs)}] " + ", ".join(f"{name}={settings[name]}" for name in SWEEP_PARAMS)
+              + f" -> {row['decode_s']}초, {row['lufs']} LUFS, {row['bpm']} BPM")
+
+    report = {
+        'prompt': prompt,
+        'genre': args.genre,
+        'model': generator.model_id,
+        'duration': args.duration,
+        'samples': args.samples,
+        'elapsed_seconds': round(time.time() - started, 1),
+        'conditioning_cache': generator.conditioning_cache.stats() if generator.conditioning_cache else None,
+        'table': rows,
+        'configs': details,
+    }
+    with open(os.path.join(args.output_dir, "sweep.json"), 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    with open(os.path.join(args.output_dir, "sweep.csv"), 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=[name for name, _ in TABLE_COLUMNS])
+        writer.writeheader()
+        writer.writerows(rows)
+
+    print(format_table(rows))
+    print(f"결과 저장: {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 단계별 소요 시간 히스토그램 구간(초)
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+# 스팬을 보관할 최근 작업 수
+MAX_TRACED_JOBS = 256
+# 메트릭 엔드포인트 기본 포트
+METRICS_PORT = 9100
+# 메트릭 엔드포인트 기본 바인드 주소 (로컬에서만 접근 가능)
+METRICS_HOST = '127.0.0.1'
+
+METRIC_PREFIX = "musicgen"
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    items = ",".join(f'{key}="{str(value)}"' for key, value in sorted(labels.items()))
+    return "{" + items + "}"
+
+
+class Tracer:
+    """
+    생성 파이프라인의 단계별 스팬과 메트릭을 기록하는 트레이서
+    - span(): 단계 이름, 소요 시간, 크기/토큰 수 등의 속성을 기록
+    - bind(): 현재 스레드에서 기록되는 스팬을 작업 ID에 연결
+    - collect(): 다른 프로세스(렌더링 풀)에서 기록한 스팬을 모아 부모 프로세스로 전달
+    - prometheus(): Prometheus 텍스트 형식 메트릭
+    - chrome_trace(): 작업별 Chrome trace(JSON) 이벤트
+    """
+
+    def __init__(self, max_jobs=MAX_TRACED_JOBS):
+        self.max_jobs = max_jobs
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._job_spans = OrderedDict()  # 작업 ID -> [스팬, ...]
+        self._histograms = {}  # 단계 -> [구간별 개수..., 합계, 개수]
+        self._bytes = defaultdict(float)
+        self._tokens = defaultdict(float)
+        self._tokens_per_second = {}
+        self._errors = defaultdict(int)
+        self._counters = defaultdict(float)  # (이름, 레이블 튜플) -> 값
+        self._info = {}
+
+    @contextmanager
+    def bind(self, job_ids):
+        """with 블록 안에서 기록되는 스팬을 job_ids 작업에 연결"""
+        previous = getattr(self._local, 'job_ids', ())
+        self._local.job_ids = tuple(job_id for job_id in job_ids if job_id)
+        try:
+            yield
+        finally:
+            self._local.job_ids = previous
+
+    @contextmanager
+    def collect(self):
+        """with 블록 안에서 기록되는 스팬을 리스트로 모음"""
+        previous = getattr(self._local, 'collector', None)
+        spans = []
+        self._local.collector = spans
+        try:
+            yield spans
+        finally:
+            self._local.collector = previous
+
+    @contextmanager
+    def span(self, name, **attrs):
+        """
+        단계 하나의 소요 시간을 기록
+        yield되는 attrs 딕셔너리에 'bytes', 'tokens' 등을 추가하면 메트릭에도 반영됨
+        """
+        start = time.time()
+        perf_start = time.perf_counter()
+        try:
+            yield attrs
+        except BaseException:
+            attrs['error'] = True
+            raise
+        finally:
+            self.record({
+                'name': name,
+                'start': start,
+                'duration': time.perf_counter() - perf_start,
+                'pid': os.getpid(),
+                'tid': threading.get_ident(),
+                'attrs': attrs,
+            })
+
+    def record(self, span, job_ids=None):
+        """완료된 스팬 기록 (job_ids를 생략하면 bind()로 연결된 작업 사용)"""
+        if job_ids is None:
+            job_ids = getattr(self._local, 'job_ids', ())
+        collector = getattr(self._local, 'collector', None)
+        if collector is not None:
+            collector.append(span)
+
+        name, duration, attrs = span['name'], span['duration'], span['attrs']
+        with self._lock:
+            histogram = self._histograms.setdefault(name, [0] * (len(DURATION_BUCKETS) + 2))
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    histogram[i] += 1
+            histogram[-2] += duration
+            histogram[-1] += 1
+            if 'bytes' in attrs:
+                self._bytes[name] += attrs['bytes']
+            if 'tokens' in attrs:
+                self._tokens[name] += attrs['tokens']
+                if duration > 0:
+                    attrs['tokens_per_second'] = attrs['tokens'] / duration
+                    self._tokens_per_second[name] = attrs['tokens_per_second']
+            if attrs.get('error'):
+                self._errors[name] += 1
+
+            for job_id in job_ids:
+                if job_id not in self._job_spans:
+                    self._job_spans[job_id] = []
+                    while len(self._job_spans) > self.max_jobs:
+                        self._job_spans.popitem(last=False)
+                self._job_spans[job_id].append(span)
+
+    def increment(self, name, value=1, **labels):
+        """카운터 메트릭 증가"""
+        with self._lock:
+            self._counters[(name, tuple(sorted(labels.items())))] += value
+
+    def set_info(self, **labels):
+        """실행 환경 정보(예: 디바이스 프로필)를 info 메트릭으로 노출"""
+        with self._lock:
+            self._info.update({key: str(value) for key, value in labels.items()})
+
+    def spans(self, job_id):
+        with self._lock:
+            return list(self._job_spans.get(job_id, []))
+
+    def chrome_trace(self, job_id):
+        """작업의 스팬을 Chrome trace 형식(chrome://tracing, Perfetto)으로 변환"""
+        events = []
+        for span in self.spans(job_id):
+            events.append({
+                'name': span['name'],
+                'cat': 'musicgen',
+                'ph': 'X',
+                'ts': span['start'] * 1e6,
+                'dur': span['duration'] * 1e6,
+                'pid': span['pid'],
+                'tid': span['tid'],
+                'args': span['attrs'],
+            })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms', 'otherData': {'job_id': job_id}}
+
+    def dump_chrome_trace(self, job_id, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.chrome_trace(job_id), f, default=str)
+        return path
+
+    def prometheus(self):
+        """Prometheus 텍스트 형식 메트릭 반환"""
+        lines = []
+        with self._lock:
+            if self._info:
+                lines.append(f"# TYPE {METRIC_PREFIX}_info gauge")
+                lines.append(f"{METRIC_PREFIX}_info{_labels(self._info)} 1")
+
+            metric = f"{METRIC_PREFIX}_stage_duration_seconds"
+            lines.append(f"# HELP {metric} Duration of pipeline stages")
+            lines.append(f"# TYPE {metric} histogram")
+            for stage, histogram in sorted(self._histograms.items()):
+                for bound, count in zip(DURATION_BUCKETS, histogram):
+                    lines.append(f"{metric}_bucket{_labels({'stage': stage, 'le': bound})} {count}")
+                lines.append(f"{metric}_bucket{_labels({'stage': stage, 'le': '+Inf'})} {histogram[-1]}")
+                lines.append(f"{metric}_sum{_labels({'stage': stage})} {histogram[-2]}")
+                lines.append(f"{metric}_count{_labels({'stage': stage})} {histogram[-1]}")
+
+            for suffix, values, kind in (
+                ('stage_bytes_total', self._bytes, 'counter'),
+                ('stage_tokens_total', self._tokens, 'counter'),
+                ('stage_tokens_per_second', self._tokens_per_second, 'gauge'),
+                ('stage_errors_total', self._errors, 'counter'),
+            ):
+                lines.append(f"# TYPE {METRIC_PREFIX}_{suffix} {kind}")
+                for stage, value in sorted(values.items()):
+                    lines.append(f"{METRIC_PREFIX}_{suffix}{_labels({'stage': stage})} {value}")
+
+            for (name, labels), value in sorted(self._counters.items()):
+                lines.append(f"{METRIC_PREFIX}_{name}{_labels(dict(labels))} {value}")
+        return "\n".join(lines) + "\n"
+
+
+# 프로세스 전체에서 공유하는 트레이서
+tracer = Tracer()
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.server.tracer.prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port=METRICS_PORT, host=METRICS_HOST, tracer=tracer):
+    """백그라운드 스레드에서 /metrics 엔드포인트 서버 시작"""
+    server = ThreadingHTTPServer((host, port), _MetricsRequestHandler)
+    server.daemon_threads = True
+    server.tracer = tracer
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    print(f"메트릭 엔드포인트: http://{host}:{port}/metrics")
+    return server
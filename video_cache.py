@@ -0,0 +1,307 @@
+import hashlib
+import os
+import tempfile
+import threading
+
+import ffmpeg
+import numpy as np
+from moviepy.editor import VideoFileClip, concatenate_videoclips, vfx
+
+from audio_post import pcm_input, audio_output, run_pcm_pipe
+
+# 미리 렌더링한 루프 영상 저장 위치
+LOOP_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".loop_cache")
+LOOP_FPS = 24
+# 루프 캐시 최대 용량 (넘으면 가장 오래 사용하지 않은 파일부터 삭제)
+LOOP_CACHE_MAX_BYTES = 2 * 1024 ** 3
+# 디코딩한 프레임 배열을 메모리에 모두 올리는 최대 크기 (넘으면 메모리 매핑으로 읽음)
+FRAME_MEMORY_LIMIT = 256 * 1024 ** 2
+# 비트 정렬 루프의 MP4 타임스케일 (루프 한 세트 길이를 프레임 단위가 아니라 1/90000초 단위로 맞춤)
+BEAT_LOOP_TIMESCALE = 90000
+# 인코더 파이프에 한 번에 써 넣는 프레임 수 (쓰기 호출 횟수와 임시 버퍼 크기의 균형)
+FRAME_WRITE_CHUNK = 32
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """파일 내용의 SHA-256 해시를 반환하는 함수"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def media_duration(path):
+    """ffprobe로 미디어 파일의 길이(초)를 읽는 함수"""
+    return float(ffmpeg.probe(path)['format']['duration'])
+
+
+def beat_cycle(loop_duration, beat_times, tempo):
+    """
+    루프 한 세트(정방향 + 역방향)가 비트 경계에서 시작하도록 하는 (한 세트 길이, 시작 오프셋)(초) 계산
+    - 비트 주기/첫 비트 위치: 비트 시각들에 직선을 맞춰 구함 (비트가 부족하면 tempo 사용)
+    - 한 세트 길이: 원래 길이에 가장 가까운 비트 n개 길이 (4비트 이상이면 마디 단위)
+    - 시작 오프셋: 영상 시작 시점의 루프 위치 (이만큼 돌려 놓으면 첫 비트에서 한 세트가 시작됨)
+    """
+    beat_times = np.asarray(beat_times, dtype=np.float64)
+    if len(beat_times) >= 4:
+        period, first_beat = np.polyfit(np.arange(len(beat_times)), beat_times, 1)
+    else:
+        period, first_beat = 60.0 / tempo, (beat_times[0] if len(beat_times) else 0.0)
+    beats = max(1, int(round(loop_duration / period)))
+    if beats >= 4:
+        beats = 4 * int(round(beats / 4))
+    cycle = beats * period
+    return cycle, float(-first_beat % cycle)
+
+
+def pingpong_index_map(source_frames, output_frames, fps=LOOP_FPS, cycle=None, offset=0.0):
+    """
+    출력 프레임 번호 -> 원본 프레임 번호 배열 (정방향 + 역방향 한 세트를 반복하는 루프)
+    cycle(초)을 주면 한 세트를 그 길이로 늘리거나 줄이고, offset(초)만큼 세트 안의 위치를 돌려 놓음 (비트 정렬)
+    역방향 구간은 MoviePy time_mirror와 같이 마지막 프레임부터 시작
+    """
+    set_frames = 2 * source_frames
+    cycle = cycle or set_frames / fps
+    position = (np.arange(output_frames) / fps + offset) / cycle % 1.0
+    phase = np.minimum((position * set_frames).astype(np.int64), set_frames - 1)
+    return np.where(phase < source_frames, phase, set_frames - 1 - phase)
+
+
+def stream_frame_map(frames, index_map, audio_path, output_path, fps=LOOP_FPS):
+    """
+    프레임 배열([프레임, 세로, 가로, 3] uint8)을 index_map 순서대로 ffmpeg 표준 입력에 써 넣어
+    libx264로 인코딩하고 오디오 파일과 합치는 함수 (디코더 탐색이나 프레임별 콜백 없음)
+    프레임은 FRAME_WRITE_CHUNK개씩 한 번에 모아 써서 파이프 쓰기 호출 수를 줄임
+    """
+    height, width = frames.shape[1:3]
+    video = ffmpeg.input('pipe:', format='rawvideo', pix_fmt='rgb24', s=f"{width}x{height}", framerate=fps).video
+    audio = ffmpeg.input(audio_path).audio
+    process = (
+        ffmpeg
+        .output(video, audio, output_path, vcodec='libx264', preset='ultrafast', pix_fmt='yuv420p',
+                acodec='aac', shortest=None, movflags='+faststart')
+        .global_args('-nostats', '-loglevel', 'error')
+        .overwrite_output()
+        .run_async(pipe_stdin=True, pipe_stderr=True)
+    )
+    try:
+        for start in range(0, len(index_map), FRAME_WRITE_CHUNK):
+            process.stdin.write(frames[index_map[start:start + FRAME_WRITE_CHUNK]].tobytes())
+        process.stdin.close()
+    except BrokenPipeError:
+        pass  # ffmpeg가 먼저 종료됨, 아래에서 오류 메시지로 보고
+    stderr = process.stderr.read()
+    process.wait()
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg 인코딩 실패: {stderr.decode(errors='replace').strip()}")
+
+
+class LoopAssetCache:
+    """
+    정방향 + 역방향 '한 세트' 루프 영상을 한 번만 인코딩해 두는 캐시
+    - 키: 원본 파일 해시, fps, 해상도
+    - 같은 키의 요청은 디코딩/재인코딩 없이 캐시된 루프 파일을 재사용
+    - 전체 크기가 max_bytes를 넘으면 가장 오래 사용하지 않은 파일부터 삭제
+    """
+
+    def __init__(self, cache_dir=LOOP_CACHE_DIR, max_bytes=LOOP_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._hashes = {}  # (경로, 수정 시각, 크기) -> 해시
+        self._frames = {}  # 프레임 캐시 키 -> 이 프로세스에서 읽어 둔 프레임 배열 (또는 메모리 매핑)
+
+    def source_hash(self, source_path):
+        """원본 파일 해시 (경로/수정 시각/크기가 같으면 다시 읽지 않음)"""
+        stat = os.stat(source_path)
+        key = (os.path.abspath(source_path), stat.st_mtime_ns, stat.st_size)
+        if key not in self._hashes:
+            self._hashes[key] = file_hash(source_path)
+        return self._hashes[key]
+
+    def loop_path(self, source_path, fps=LOOP_FPS, resolution=None):
+        """캐시 키에 해당하는 루프 파일 경로 반환 (resolution은 (가로, 세로) 또는 원본 해상도)"""
+        if resolution is None:
+            stream = next(s for s in ffmpeg.probe(source_path)['streams'] if s['codec_type'] == 'video')
+            resolution = (int(stream['width']), int(stream['height']))
+        width, height = resolution
+        key = f"{self.source_hash(source_path)[:16]}_{fps}fps_{width}x{height}"
+        return os.path.join(self.cache_dir, f"loop_{key}.mp4")
+
+    def _touch_or_create(self, path, create):
+        """캐시 파일의 사용 시각을 갱신하고, 없으면 create(path)로 만든 뒤 용량 한도 적용 (잠금 안에서 호출)"""
+        if os.path.exists(path):
+            os.utime(path)
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        create(path)
+        self._evict(keep=path)
+
+    def _evict(self, keep):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if os.path.isfile(path):
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, path, stat.st_size))
+        total = sum(size for _, _, size in entries)
+        for _, path, size in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+                total -= size
+            except OSError as e:
+                # 다른 프로세스가 사용 중인 파일(예: 메모리 매핑된 프레임 배열)은 건너뜀
+                print(f"루프 캐시 파일을 삭제할 수 없습니다: {str(e)}")
+
+    def get_loop(self, source_path, fps=LOOP_FPS, resolution=None):
+        """루프 파일 경로를 반환하며, 캐시에 없으면 한 번 렌더링해서 저장"""
+        with self._lock:
+            path = self.loop_path(source_path, fps, resolution)
+            self._touch_or_create(path, lambda target: self._render(source_path, target, fps, resolution))
+        return path
+
+    def get_frames(self, source_path, fps=LOOP_FPS):
+        """
+        원본 영상을 fps로 한 번만 디코딩한 RGB 프레임 배열 [프레임, 세로, 가로, 3] (uint8) 반환
+        디코딩 결과는 .npy로 캐시되어 다른 렌더링 프로세스도 다시 디코딩하지 않으며,
+        FRAME_MEMORY_LIMIT보다 크면 메모리 매핑으로 읽음
+        읽은 배열은 프로세스마다 원본 해시 키로 보관하므로 렌더링 워커는 파일을 한 번만 읽음
+        """
+        key = f"{self.source_hash(source_path)[:16]}_{fps}fps"
+        path = os.path.join(self.cache_dir, f"frames_{key}.npy")
+        with self._lock:
+            frames = self._frames.get(key)
+            if frames is not None:
+                # 다른 프로세스가 파일을 지웠어도 읽어 둔 배열(메모리 매핑 포함)은 그대로 유효함
+                if os.path.exists(path):
+                    os.utime(path)
+                return frames
+            self._touch_or_create(path, lambda target: self._decode_frames(source_path, target, fps))
+            mmap_mode = 'r' if os.path.getsize(path) > FRAME_MEMORY_LIMIT else None
+            frames = np.load(path, mmap_mode=mmap_mode)
+            self._frames[key] = frames
+        return frames
+
+    def _decode_frames(self, source_path, path, fps):
+        # 프레임 수를 미리 알 수 없으므로 임시 raw 파일에 받은 뒤 .npy 헤더를 붙여 메모리 매핑 파일로 옮김
+        print(f"루프 원본 프레임 디코딩 중: {path}")
+        stream = next(s for s in ffmpeg.probe(source_path)['streams'] if s['codec_type'] == 'video')
+        width, height = int(stream['width']), int(stream['height'])
+        fd, raw_path = tempfile.mkstemp(suffix='.rgb', dir=self.cache_dir)
+        os.close(fd)
+        tmp_path = f"{raw_path}.npy"
+        try:
+            (
+                ffmpeg
+                .input(source_path)
+                .output(raw_path, format='rawvideo', pix_fmt='rgb24', r=fps)
+                .overwrite_output()
+                .run(quiet=True)
+            )
+            raw = np.memmap(raw_path, dtype=np.uint8, mode='r')
+            frames = np.lib.format.open_memmap(
+                tmp_path, mode='w+', dtype=np.uint8, shape=(raw.size // (height * width * 3), height, width, 3)
+            )
+            frames.reshape(-1)[:] = raw[:frames.size]
+            frames.flush()
+            del frames, raw
+            os.replace(tmp_path, path)
+        finally:
+            for leftover in (raw_path, tmp_path):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+
+    def render_beat_loop(self, source_path, path, cycle, offset):
+        """
+        한 세트 길이를 cycle초로 늘리거나 줄이고 offset초만큼 돌려 놓은 루프 영상을 path에 렌더링
+        -stream_loop로 스트림 복사해 반복해도 한 세트가 정확히 cycle초마다 시작되도록
+        프레임 간격을 원본 비율 그대로 늘려서 인코딩 (출력 fps는 원본 fps / 늘린 비율)
+        길이/오프셋이 트랙마다 달라 재사용되지 않으므로 캐시하지 않고 작업 디렉토리에 만듦 (한 세트 분량만 인코딩)
+        """
+        # ffmpeg 필터만 사용: 정방향 + reverse 연결, setpts로 길이 조정, trim으로 시작 위치 회전
+        offset = offset % cycle
+        source = ffmpeg.input(source_path).video.split()
+        one_set = ffmpeg.concat(source[0], source[1].filter('reverse'), v=1, a=0)
+        one_set = one_set.filter('setpts', f"{cycle / (2 * media_duration(source_path))}*PTS")
+        if offset > 0:
+            parts = one_set.split()
+            one_set = ffmpeg.concat(
+                parts[0].filter('trim', start=offset).filter('setpts', 'PTS-STARTPTS'),
+                parts[1].filter('trim', end=offset).filter('setpts', 'PTS-STARTPTS'),
+                v=1, a=0
+            )
+
+        (
+            ffmpeg
+            .output(one_set, path, vcodec='libx264', preset='veryfast', pix_fmt='yuv420p',
+                    vsync='passthrough', video_track_timescale=BEAT_LOOP_TIMESCALE)
+            .overwrite_output()
+            .run(quiet=True)
+        )
+
+    def _render(self, source_path, path, fps, resolution):
+        print(f"루프 영상 캐시 생성 중: {path}")
+        target_resolution = (resolution[1], resolution[0]) if resolution else None
+        animation = VideoFileClip(source_path, audio=False, target_resolution=target_resolution)
+        reversed_animation = animation.fx(vfx.time_mirror)
+        one_set = concatenate_videoclips([animation, reversed_animation])
+
+        # 임시 파일에 쓴 뒤 교체해서 다른 프로세스가 미완성 파일을 읽지 않도록 함
+        fd, tmp_path = tempfile.mkstemp(suffix='.mp4', dir=self.cache_dir)
+        os.close(fd)
+        try:
+            one_set.write_videofile(
+                tmp_path,
+                fps=fps,
+                codec='libx264',
+                audio=False,
+                preset='medium',
+                logger=None
+            )
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            animation.close()
+            reversed_animation.close()
+            one_set.close()
+
+
+def mux_looped_video(visual_path, audio_path, output_path, duration=None):
+    """
+    인코딩된 영상을 -stream_loop로 무한 반복해 오디오 길이로 자르고 AAC 오디오와 합치는 함수
+    비디오는 스트림 복사라서 프레임 디코딩/재인코딩이 없음
+    """
+    if duration is None:
+        duration = media_duration(audio_path)
+    video = ffmpeg.input(visual_path, stream_loop=-1).video
+    audio = ffmpeg.input(audio_path).audio
+    (
+        ffmpeg
+        .output(video, audio, output_path, vcodec='copy', acodec='aac', t=duration, movflags='+faststart')
+        .overwrite_output()
+        .run(quiet=True)
+    )
+
+
+def mux_looped_pcm(visual_path, wav, sample_rate, output_path, gain=1.0, compressor=True,
+                   audio_path=None, audio_format=None):
+    """
+    mux_looped_video와 같지만 오디오를 파일 대신 메모리의 PCM([채널, 샘플] 배열)에서 파이프로 받는 함수
+    게인/압축은 청크마다 적용되며, audio_path/audio_format을 주면 같은 ffmpeg 실행에서
+    압축 오디오 결과물(opus/mp3/flac)도 함께 저장
+    """
+    duration = wav.shape[-1] / sample_rate
+    video = ffmpeg.input(visual_path, stream_loop=-1).video
+    audio = pcm_input(sample_rate, wav.shape[0]).audio
+    outputs = [
+        ffmpeg.output(video, audio, output_path, vcodec='copy', acodec='aac', t=duration, movflags='+faststart')
+    ]
+    if audio_path is not None:
+        outputs.append(audio_output(audio, audio_path, audio_format))
+    run_pcm_pipe(outputs, wav, sample_rate, gain, compressor)
@@ -1,16 +1,132 @@
-import gradio as gr
-from main import LocalEDMGenerator
+from startup_timing import startup_timer
+with startup_timer.phase("import gradio"):
+    import gradio as gr
+from artifacts import ArtifactStore
 from settings import *  # 설정 파일 임포트
 import os
 import time
 import random
+import queue
+import threading
+import traceback
+
+# 모델 워밍업 시점
+# - 'startup': UI가 뜬 직후 백그라운드에서 로드
+# - 'first_request': 첫 생성 요청이 들어올 때 로드
+# torch / audiocraft / moviepy는 모델을 로드할 때 처음 임포트됨
+MODEL_WARMUP = os.environ.get('MODEL_WARMUP', 'startup')
+
+# 동시에 받을 수 있는 요청 수
+# 요청 순서는 Gradio 큐가 아니라 작업 스케줄러가 정하므로 배치 크기보다 넉넉하게 둠
+MAX_CONCURRENT_REQUESTS = 32
+
+# 모델 복제본 수 (1보다 크면 복제본마다 모델 서버 프로세스를 띄워 동시에 생성)
+# GPU가 여러 개면 디바이스별로, 없으면 CPU 코어를 나눠서 배정. MODEL_REPLICA_STUB=1이면 스텁 모델 사용
+MODEL_REPLICAS = int(os.environ.get('MODEL_REPLICAS', 1))
+
+# Prometheus 형식 메트릭 엔드포인트 포트 (0이면 비활성화)
+METRICS_PORT = int(os.environ.get('METRICS_PORT', 9100))
+# 메트릭 엔드포인트 바인드 주소 (외부 Prometheus가 수집하면 0.0.0.0으로 지정)
+METRICS_HOST = os.environ.get('METRICS_HOST', '127.0.0.1')
 
 class MusicGenWebApp:
     def __init__(self):
-        self.generator = LocalEDMGenerator()
+        # 모델과 작업 파이프라인은 워밍업 시점에 백그라운드에서 생성
+        self.generator = None
+        self.jobs = None
+        self.replica_pool = None
+        self.model_error = None
+        self._model_ready = threading.Event()
+        self._warmup_lock = threading.Lock()
+        self._warmup_thread = None
         self.current_settings = None
+        
+        # 작업별 디렉토리에 결과물을 저장하고, 오래된 결과물은 백그라운드에서 정리
+        self.artifacts = ArtifactStore(on_remove=self._forget_job)
+        self.artifacts.start_reaper()
 
-    def update_settings(self, genre, bpm, temperature, top_k, top_p, cfg_coef):
+    def _forget_job(self, job_id):
+        if self.jobs is not None:
+            self.jobs.forget(job_id)
+
+    def start_warmup(self):
+        """백그라운드 스레드에서 모델 로딩 시작 (이미 시작했으면 무시)"""
+        with self._warmup_lock:
+            if self._warmup_thread is None:
+                self._warmup_thread = threading.Thread(target=self._load_model, name="model-warmup", daemon=True)
+                self._warmup_thread.start()
+
+    def _load_model(self):
+        try:
+            with startup_timer.phase("import main (torch, audiocraft, moviepy)"):
+                from main import LocalEDMGenerator
+            
+            # MODEL_SERVER_URL이 설정되어 있으면 모델을 직접 로드하지 않고 공유 모델 서버 사용
+            model_server_url = os.environ.get('MODEL_SERVER_URL')
+            with startup_timer.phase("load model"):
+                model = None
+                if model_server_url:
+                    from model_server import RemoteMusicGen
+                    model = RemoteMusicGen(model_server_url)
+                elif MODEL_REPLICAS > 1:
+                    # 복제본 풀: 처리 중인 요청이 가장 적은 정상 복제본으로 라우팅
+                    from replicas import launch_replicas, PooledMusicGen
+                    self.replica_pool = launch_replicas(
+                        MODEL_REPLICAS, stub=os.environ.get('MODEL_REPLICA_STUB') == '1'
+                    )
+                    self.replica_pool.wait_ready(minimum=1)
+                    model = PooledMusicGen(self.replica_pool)
+                from result_cache import ResultCache
+                result_cache = ResultCache()
+                self.generator = LocalEDMGenerator(model, result_cache=result_cache)
+            
+            # 장르 기본 프롬프트의 텍스트 조건을 미리 인코딩 (장르별 첫 요청도 조건 인코딩 없이 시작)
+            with startup_timer.phase("warm conditioning cache"):
+                self.generator.warm_conditioning(
+                    [prompt for prompts in genre_prompts.values() for prompt in prompts]
+                )
+            
+            # 생성(배치)과 렌더링(프로세스 풀)을 분리한 작업 파이프라인
+            # 스케줄러가 예상 비용이 짧은 작업부터 실행하고 지연 한도를 넘는 요청은 거절
+            with startup_timer.phase("start job pipeline"):
+                from jobs import JobManager
+                from scheduler import CostScheduler
+                scheduler = CostScheduler(self.generator.capacity, self.generator.frame_rate)
+                self.jobs = JobManager(
+                    self.generator,
+                    result_cache=result_cache,
+                    artifact_store=self.artifacts,
+                    scheduler=scheduler,
+                    generation_workers=MODEL_REPLICAS if self.replica_pool is not None else 1
+                )
+        except Exception as e:
+            self.model_error = str(e)
+            print(f"모델 로드 중 오류 발생: {str(e)}")
+            traceback.print_exc()
+        finally:
+            self._model_ready.set()
+            print(startup_timer.report())
+
+    def ensure_model(self):
+        """모델이 준비될 때까지 기다리고, 로드에 실패했으면 예외 발생"""
+        self.start_warmup()
+        self._model_ready.wait()
+        if self.jobs is None:
+            raise RuntimeError(f"모델을 사용할 수 없습니다: {self.model_error}")
+
+    def model_status(self):
+        """UI에 표시할 모델 준비 상태"""
+        if not self._model_ready.is_set():
+            if self._warmup_thread is None:
+                return "💤 모델 대기 중: 첫 요청 시 로드됩니다"
+            return "🔥 모델 준비 중 (warming up)... 요청은 준비가 끝나면 처리됩니다"
+        if self.jobs is None:
+            return f"❌ 모델 로드 실패: {self.model_error}"
+        if self.replica_pool is not None:
+            return f"✅ 모델 준비 완료 (정상 복제본 {self.replica_pool.healthy_count}/{len(self.replica_pool.replicas)})"
+        return "✅ 모델 준비 완료"
+
+    def update_settings(self, genre, bpm, temperature, top_k, top_p, cfg_coef, seed=-1):
         """선택된 장르의 설정을 업데이트"""
         settings = get_genre_settings(genre).copy()
         settings.update({
@@ -18,52 +134,80 @@ class MusicGenWebApp:
             'temperature': temperature,
             'top_k': int(top_k),
             'top_p': top_p,
-            'cfg_coef': cfg_coef
+            'cfg_coef': cfg_coef,
+            'seed': int(seed) if seed is not None and seed >= 0 else None
         })
         return settings
 
-    def generate_music(self, prompt, genre_select, duration, bpm, temperature, top_k, top_p, cfg_coef, progress=gr.Progress()):
+    def generate_music(self, prompt, genre_select, duration, bpm, temperature, top_k, top_p, cfg_coef, seed,
+                       reference_audio=None, beat_sync=False, progress=gr.Progress()):
+        """
+        음악 생성 이벤트 핸들러 (제너레이터)
+        (audio_output, video_output, job_id_output) 순서로,
+        작업 ID와 디코딩된 오디오 구간을 먼저 스트리밍하고 마지막에 완성된 비디오 경로를 반환
+        reference_audio(업로드된 파일 경로)가 있으면 그 멜로디(크로마)를 조건으로 생성
+        beat_sync가 켜져 있으면 BPM 설정을 사전 템포로 비트를 추적해 루프 영상을 비트에 맞춤
+        """
         try:
-            # 설정 업데이트
-            self.current_settings = self.update_settings(
-                genre_select, bpm, temperature, top_k, top_p, cfg_coef
+            # 설정 업데이트 (동시 요청끼리 공유하지 않도록 지역 변수 사용)
+            settings = self.update_settings(
+                genre_select, bpm, temperature, top_k, top_p, cfg_coef, seed
             )
-            self.current_settings['duration'] = int(duration)
+            settings['duration'] = int(duration)
+            if reference_audio:
+                settings['reference_audio'] = reference_audio
+            if beat_sync:
+                settings['beat_sync'] = True
+            self.current_settings = settings
+            
+            # 모델이 아직 로드 중이면 준비될 때까지 대기
+            if not self._model_ready.is_set():
+                progress(0.0, desc="모델 준비 중 (warming up)...")
+            self.ensure_model()
             
-            # 이전 파일들 정리
-            self.cleanup_old_files()
+            # 음악 생성 (같은 파라미터의 동시 요청과 배치로 묶이고, 렌더링은 별도 프로세스에서 처리됨)
+            audio_chunks = queue.Queue()
+            job = self.jobs.submit(prompt, settings, progress, on_audio=audio_chunks.put)
+            if job.status == 'rejected':
+                raise gr.Error(job.error)
+            yield gr.update(), gr.update(), job.id
             
-            # 음악 생성 (직접 파일 경로 받기)
-            video_path = self.generator.generate_track(prompt, self.current_settings, progress)
+            # 디코딩된 구간을 도착하는 대로 스트리밍
+            while not job.done or not audio_chunks.empty():
+                try:
+                    yield audio_chunks.get(timeout=0.2), gr.update(), gr.update()
+                except queue.Empty:
+                    continue
+            
+            video_path = job.result
             
             # 파일 존재 여부 확인
             if video_path and os.path.exists(video_path):
                 print(f"생성된 비디오 파일: {video_path}")
-                return video_path
+                yield gr.update(), video_path, gr.update()
             else:
                 print("비디오 파일 생성 실패")
-                return None
+                yield gr.update(), None, gr.update()
                 
+        except gr.Error:
+            raise
         except Exception as e:
             print(f"음악 생성 중 오류 발생: {str(e)}")
-            return None
+            yield gr.update(), None, gr.update()
 
-    def cleanup_old_files(self):
-        """오래된 생성 파일들을 정리"""
-        try:
-            current_time = time.time()
-            for file in os.listdir():
-                if file.endswith('.wav') or file.endswith('_with_video.mp4'):
-                    file_path = os.path.join(os.getcwd(), file)
-                    # 30분 이상 된 파일 삭제
-                    if current_time - os.path.getctime(file_path) > 1800:
-                        os.remove(file_path)
-        except Exception as e:
-            print(f"파일 정리 중 오류 발생: {str(e)}")
+    def get_job_status(self, job_id):
+        """작업 ID로 진행 상태 조회"""
+        if self.jobs is None:
+            return {'error': self.model_status()}
+        status = self.jobs.status(job_id.strip())
+        if status is None:
+            return {'error': f"작업을 찾을 수 없습니다: {job_id}"}
+        return status
 
     def create_ui(self):
         with gr.Blocks(title="AI Music Generator") as app:
             gr.Markdown("# AI Music Generator")
+            model_status = gr.Markdown(self.model_status())
             
             with gr.Row():
                 with gr.Column():
@@ -130,6 +274,19 @@ class MusicGenWebApp:
                             label="CFG Coefficient",
                             info="프롬프트 준수 강도"
                         )
+                        
+                        seed_input = gr.Number(
+                            value=-1,
+                            precision=0,
+                            label="Seed",
+                            info="-1이면 무작위, 지정하면 같은 설정의 결과를 캐시에서 재사용"
+                        )
+                        
+                        beat_sync_checkbox = gr.Checkbox(
+                            value=False,
+                            label="비트 동기화",
+                            info="생성된 음악의 비트에 맞춰 루프 영상의 속도와 시작 위치를 조정 (BPM은 템포 추정의 기준값)"
+                        )
                     
                     prompt_input = gr.Textbox(
                         label="프롬프트 입력",
@@ -137,13 +294,33 @@ class MusicGenWebApp:
                         lines=5
                     )
                     
+                    # 멜로디 조건 생성 (musicgen-melody 모델에서만 사용 가능)
+                    reference_audio_input = gr.Audio(
+                        label="레퍼런스 오디오 (선택)",
+                        type="filepath",
+                        source="upload"
+                    )
+                    
                     generate_btn = gr.Button("음악 생성", variant="primary")
                 
                 with gr.Column():
+                    # 디코딩이 끝난 구간부터 바로 들을 수 있는 스트리밍 오디오
+                    audio_output = gr.Audio(
+                        label="미리 듣기",
+                        streaming=True,
+                        autoplay=True
+                    )
+                    
                     video_output = gr.Video(
                         label="생성된 음악 비디오",
                         autoplay=True
                     )
+                    
+                    # 작업 상태 조회
+                    with gr.Accordion("작업 상태", open=False):
+                        job_id_output = gr.Textbox(label="작업 ID")
+                        status_btn = gr.Button("상태 조회")
+                        status_output = gr.JSON(label="작업 상태")
             
             # 장르 선택시 기본값 업데이트
             def update_default_settings(genre):
@@ -181,9 +358,18 @@ class MusicGenWebApp:
                     temperature_slider,
                     top_k_slider,
                     top_p_slider,
-                    cfg_coef_slider
+                    cfg_coef_slider,
+                    seed_input,
+                    reference_audio_input,
+                    beat_sync_checkbox
                 ],
-                outputs=[video_output]
+                outputs=[audio_output, video_output, job_id_output]
+            )
+            
+            status_btn.click(
+                fn=self.get_job_status,
+                inputs=[job_id_output],
+                outputs=[status_output]
             )
             
             # 사용 설명
@@ -193,20 +379,36 @@ class MusicGenWebApp:
                 2. 음악 길이를 설정하세요 (10초-120초)
                 3. 필요한 경우 고급 설정을 조정하세요
                 4. 프롬프트를 입력하거나 수정하세요
-                5. '음악 생성' 버튼을 클릭하세요
+                5. (선택) 레퍼런스 오디오를 올리면 그 멜로디를 따라 생성합니다
+                6. '음악 생성' 버튼을 클릭하세요
                 
                 고급 설정:
-                - BPM: 음악의 템포를 결정합니다
+                - BPM: 음악의 템포를 결정합니다 (비트 동기화 시 템포 추정의 기준값)
                 - Temperature: 높을수록 더 다양한 결과가 나오지만 불안정할 수 있습니다
                 - Top K: 각 단계에서 고려할 상위 토큰의 수입니다
                 - Top P: 누적 확률 임계값으로, 다양성을 조절합니다
                 - CFG Coefficient: 프롬프트 준수 강도를 결정합니다
                 """)
+            
+            # 모델 준비 상태 주기적 갱신
+            app.load(fn=self.model_status, inputs=None, outputs=[model_status], every=2)
         
         return app
 
 if __name__ == "__main__":
     app = MusicGenWebApp()
-    webapp = app.create_ui()
-    webapp.queue()
-    webapp.launch(share=True) 
\ No newline at end of file
+    with startup_timer.phase("build ui"):
+        webapp = app.create_ui()
+        # 대기 중인 요청이 작업 스케줄러에 모두 보이도록 Gradio 큐의 동시 처리 수를 넉넉하게 설정
+        webapp.queue(concurrency_count=MAX_CONCURRENT_REQUESTS)
+    with startup_timer.phase("launch ui"):
+        webapp.launch(share=True, prevent_thread_lock=True)
+    print(startup_timer.report("UI 시작 시간 보고서"))
+    
+    if METRICS_PORT:
+        from tracing import start_metrics_server
+        start_metrics_server(METRICS_PORT, METRICS_HOST)
+    
+    if MODEL_WARMUP == 'startup':
+        app.start_warmup()
+    webapp.block_thread() 
\ No newline at end of file